@@ -6,12 +6,20 @@ import pandas as pd
 from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
 
+from split_search import count_matrix, optimize_split, search_seeds, upper_bound
+
+#Fraction of the participants in the validation and test sets together:
+EVAL_SIZE = 0.4
+
 
 def _split_on_participant(df, rand_seed):
         unique_participants = np.unique(df.video_name.values)
-        train_participants, eval_participants = train_test_split(unique_participants, test_size=0.4, random_state=rand_seed)
+        train_participants, eval_participants = train_test_split(unique_participants, test_size=EVAL_SIZE, random_state=rand_seed)
         val_participants, test_participants = train_test_split(eval_participants, test_size=0.5, random_state=rand_seed)
         
+        return _select_participants(df, train_participants, val_participants, test_participants)
+
+def _select_participants(df, train_participants, val_participants, test_participants):
         train_df = df[df.video_name.isin(train_participants)].copy()
         val_df = df[df.video_name.isin(val_participants)].copy()
         test_df = df[df.video_name.isin(test_participants)].copy()
@@ -19,23 +27,25 @@ def _split_on_participant(df, rand_seed):
         
         return train_df, val_df, test_df
 
-def stratified_split(df, splits=1000):
-    rand_seeds = []
-    num_glosses_in_common = []
-    glosses_in_common_list = []
-    for i in range(splits):
-        rand_seed = random.randint(1, 100000)
-        rand_seeds.append(rand_seed)
-        train_df, val_df, test_df = _split_on_participant(df, rand_seed)
-        glosses_in_common = set(train_df.gloss.unique())&  set(val_df.gloss.unique()) &  set(test_df.gloss.unique())
-        num_glosses_in_common.append(len(glosses_in_common))
-        glosses_in_common_list.append(glosses_in_common)
-
-    max_num_glosses_arg = np.argmax(num_glosses_in_common)
-    max_num_glosses_seed = rand_seeds[max_num_glosses_arg]
-    max_glosses_in_common = glosses_in_common_list[max_num_glosses_arg]
-
-    train, val, test = _split_on_participant(df, max_num_glosses_seed)
+def stratified_split(df, splits=1000, num_workers=1, time_budget=None, target_score=None, method='random'):
+    participants, _glosses, counts = count_matrix(df, 'video_name')
+    if method == 'optimize':
+        #Deterministic greedy + local search on the participant x gloss count matrix (see split_search.py):
+        result = optimize_split(counts, EVAL_SIZE)
+        print(f'Optimized split: {result.score} glosses in common '
+              f'(upper bound {upper_bound(counts > 0)}, {result.seconds:.1f}s).')
+        train, val, test = _select_participants(df, participants[result.train], participants[result.val],
+                                                participants[result.test])
+    else:
+        #Score the splits of random seeds on the participant x gloss incidence matrix (see split_search.py):
+        rand_seeds = [random.randint(1, 100000) for _ in range(splits)]
+        result = search_seeds(counts > 0, rand_seeds, EVAL_SIZE, num_workers, time_budget=time_budget,
+                              target_score=target_score)
+        print(f'Best split: seed {result.seed} with {result.score} glosses in common '
+              f'(upper bound {upper_bound(counts > 0)}, {result.trials} trials in {result.seconds:.1f}s).')
+        train, val, test = _split_on_participant(df, result.seed)
+
+    max_glosses_in_common = set(train.gloss.unique()) & set(val.gloss.unique()) & set(test.gloss.unique())
 
     train.drop(train[~train.gloss.isin(max_glosses_in_common)].index, inplace=True)
     val.drop(val[~val.gloss.isin(max_glosses_in_common)].index, inplace=True)
@@ -53,7 +63,7 @@ def stratified_split(df, splits=1000):
 
     df_out = pd.concat([train, val, test])
     
-    return df_out, glosses_in_common_list[max_num_glosses_arg]
+    return df_out, max_glosses_in_common
 
 def encode_labels(df):
     dfc = df.copy()
@@ -82,6 +92,15 @@ if __name__ == '__main__':
 
     parser.add_argument('--csv_in', type=str, help='Input .csv file from clean_dataset.py step.')
     parser.add_argument('--csv_out', type=str, help='Output .csv of split dataset ready for clip extraction.')
+    parser.add_argument('--split_method', type=str, choices=['random', 'optimize'], default='random',
+                        help='Try random seeds for the participant split, or optimize the split deterministically.')
+    parser.add_argument('--trials', type=int, default=1000, help='Number of random seeds to try for the split.')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of parallel worker processes for the seed search.')
+    parser.add_argument('--time_budget', type=float, help='Stop the seed search after this many seconds.')
+    parser.add_argument('--target_score', type=int,
+                        help='Stop the seed search when a split with this many glosses in common is found '
+                             '(default: the number of glosses that occur for at least three participants).')
+    parser.add_argument('--seed', type=int, help='Seed for drawing the random seeds, for a reproducible split.')
 
     args = parser.parse_args()
     
@@ -96,7 +115,10 @@ if __name__ == '__main__':
 
     #3. Perform stratified split:
     #   Form should now be: ['video_name', 'start_ms', 'end_ms', 'gloss', 'Subset']
-    _tmp, glosses = stratified_split(step2_df)
+    if args.seed is not None:
+        random.seed(args.seed)
+    _tmp, glosses = stratified_split(step2_df, args.trials, args.jobs, args.time_budget, args.target_score,
+                                     args.split_method)
 
     print(f'There are {len(_tmp.loc[_tmp.Subset == "train"])} training samples,', end=' ')
     print(f'{len(_tmp.loc[_tmp.Subset == "val"])} validation samples,', end=' ')
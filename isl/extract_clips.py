@@ -3,7 +3,10 @@ import csv
 import argparse
 import subprocess
 
-def _extract_clip(vid_dir, video, fps, start_ms, end_ms, out_dir):
+from clip_scheduler import run_jobs
+from probe_cache import ProbeCache
+
+def _extract_clip(vid_dir, video, fps, start_ms, end_ms, out_dir, w, h):
     start_ms = int(float(start_ms))
     end_ms = int(float(end_ms))
     
@@ -16,19 +19,13 @@ def _extract_clip(vid_dir, video, fps, start_ms, end_ms, out_dir):
     source = os.path.join(vid_dir, f'{video}.mov')
     
     if os.path.isfile(out_vid):
-        return
-
-    #Get width and height of videos as these differ: 
-    res = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=width,height", "-of", "csv=p=0", source], capture_output=True, text=True)
-    info = res.stdout.split(',')
-    w = int(info[0])
-    h = int(info[-1].split('\\')[0])
+        return out_name, 0
 
     #Create clip:
-    subprocess.run(["ffmpeg", "-i", source, "-ss", f"{start_ms}ms", "-to", f"{end_ms}ms",
+    res = subprocess.run(["ffmpeg", "-i", source, "-ss", f"{start_ms}ms", "-to", f"{end_ms}ms",
          "-filter:v", f"fps={fps}, crop={w}:{h}:0:0", out_vid])
 
-    return out_name
+    return out_name, res.returncode
 
 
 def main(args):
@@ -40,15 +37,37 @@ def main(args):
         if not _header == ['video_name', 'fps', 'start_ms', 'end_ms', 'Subset', 'Participant', 'Label']:
             raise Exception("CSV not in correct form. Check column values.")
 
-        out_samples = []
-        Id = 0
-        for row in reader:
-            video_name, fps, start_ms, end_ms, subset, participant, label = row
-
-            clip_name = _extract_clip(args.vid_dir, video_name, fps, start_ms, end_ms, args.out_dir)
-
-            out_samples.append([Id, label, participant, clip_name, subset])
-            Id += 1
+        rows = list(reader)
+
+    #Get width and height of videos as these differ (probed once per video and cached):
+    sources = [os.path.join(args.vid_dir, f'{row[0]}.mov') for row in rows]
+    probe_cache = ProbeCache(args.probe_cache)
+    failed_sources = probe_cache.probe_all(sources, args.jobs)
+    for source in failed_sources:
+        print(f"Skipping the samples of {source}: the video can not be probed.")
+
+    #Extract clips in parallel, grouping the clips of the same video:
+    jobs, groups, job_rows = [], [], []
+    for source, row in zip(sources, rows):
+        video_name, fps, start_ms, end_ms, subset, participant, label = row
+        metadata = probe_cache.get(source)
+        if metadata is None:
+            continue
+        jobs.append((args.vid_dir, video_name, fps, start_ms, end_ms, args.out_dir,
+                     metadata['width'], metadata['height']))
+        groups.append(video_name)
+        job_rows.append(row)
+    results = run_jobs(_extract_clip, jobs, groups, args.jobs)
+
+    failed_jobs = sum(1 for _clip_name, exit_code in results if exit_code != 0)
+    if failed_jobs > 0:
+        print(f"{failed_jobs} of {len(results)} ffmpeg jobs failed.")
+
+    #Samples are written in the original row order:
+    out_samples = []
+    for Id, (row, (clip_name, _exit_code)) in enumerate(zip(job_rows, results)):
+        video_name, fps, start_ms, end_ms, subset, participant, label = row
+        out_samples.append([Id, label, participant, clip_name, subset])
 
     with open(args.csv_out, 'w') as output_samples_csv:
         writer = csv.writer(output_samples_csv)
@@ -63,6 +82,8 @@ if __name__ == '__main__':
     parser.add_argument('--csv_in', type=str, help='Input .csv file from create_dataset.py step.')
     parser.add_argument('--out_dir', type=str, help='Path to clips directory.')
     parser.add_argument('--csv_out', type=str, help='Output .csv file.')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of parallel worker processes.')
+    parser.add_argument('--probe_cache', type=str, default=None, help='Optional: JSON file to cache video metadata in.')
 
     args = parser.parse_args()
 
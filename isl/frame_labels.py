@@ -0,0 +1,123 @@
+"""Store the per-frame labels of the annotation tiers of a video compactly, and expand them on demand.
+
+`write_frames.py` labels every frame of a video with the annotation of every tier at that frame. Written as a CSV file,
+this is one cell per frame and per tier, which mostly contains the same strings. The compact format stores the
+annotations of every tier as frame intervals instead, in an NPZ archive:
+    - num_frames: The number of frames of the video.
+    - tiers: The names of the tiers, in order.
+    - vocabulary: The distinct labels of all tiers.
+    - tier_offsets: For tier t, its intervals are the entries tier_offsets[t]:tier_offsets[t + 1] of the arrays below.
+    - starts, ends: The first frame and the frame after the last frame of every interval.
+    - codes: The index of the label of every interval in the vocabulary.
+The intervals of a tier are applied in order, so a later annotation overwrites an earlier one where they overlap, as
+in the CSV format. Frames without an annotation get the label `MISSING_LABEL`."""
+import numpy as np
+import pandas as pd
+
+LABEL_FORMATS = ('csv', 'npz')
+MISSING_LABEL = 'Nan'
+
+
+def extension(label_format: str) -> str:
+    """Get the file extension (including the dot) of label files in the given format."""
+    return '.csv' if label_format == 'csv' else '.npz'
+
+
+class FrameLabels:
+    """The labels of every frame of a video, for every annotation tier, stored as intervals of frames."""
+
+    def __init__(self, num_frames: int, tiers: [str], vocabulary: [str], tier_offsets: np.ndarray, starts: np.ndarray,
+                 ends: np.ndarray, codes: np.ndarray):
+        """Create a new FrameLabels instance. Use `from_annotations` or `load` instead.
+
+        :param num_frames: The number of frames of the video.
+        :param tiers: The names of the tiers.
+        :param vocabulary: The distinct labels.
+        :param tier_offsets: The offsets of the intervals of every tier, with length len(tiers) + 1.
+        :param starts: The first frame of every interval.
+        :param ends: The frame after the last frame of every interval.
+        :param codes: The index of the label of every interval in the vocabulary."""
+        self.num_frames = num_frames
+        self.tiers = list(tiers)
+        self.vocabulary = list(vocabulary)
+        self._tier_offsets = tier_offsets
+        self._starts = starts
+        self._ends = ends
+        self._codes = codes
+
+    @classmethod
+    def from_annotations(cls, annotations: {str: list}, FPS: float, num_frames: int) -> 'FrameLabels':
+        """Convert the annotations of a video to frame intervals.
+
+        A label is given to the frames from and including the start time of the annotation up to and including the
+        end time: the start and end times in ms are divided by 1000 to get the second values, and multiplied by the
+        frames per second to get the frame indices.
+
+        :param annotations: The annotations of every tier, formatted as [start_time, end_time, label, ...] (see
+            parse_elan.py).
+        :param FPS: Frames per second of the video.
+        :param num_frames: The number of frames of the video.
+        :raises AssertionError: If an annotation ends after the last frame of the video."""
+        vocabulary = dict()
+        tier_offsets = [0]
+        starts, ends, codes = [], [], []
+        for tier_annos in annotations.values():
+            for anno in tier_annos:
+                start_time_frame_i = int((anno[0]/1000)*FPS)
+                end_time_frame_i = int((anno[1]/1000)*FPS)
+                # Annotations that end before their start frame do not label any frames.
+                if end_time_frame_i < start_time_frame_i:
+                    continue
+                assert end_time_frame_i < num_frames, 'Annotation ends after the last frame of the video.'
+                label = '\t'.join(anno[2:])
+                starts.append(start_time_frame_i)
+                ends.append(end_time_frame_i + 1)
+                codes.append(vocabulary.setdefault(label, len(vocabulary)))
+            tier_offsets.append(len(starts))
+        return cls(num_frames, annotations.keys(), vocabulary.keys(), np.array(tier_offsets, dtype=np.int64),
+                   np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64), np.array(codes, dtype=np.int32))
+
+    @classmethod
+    def load(cls, path: str) -> 'FrameLabels':
+        """Load the labels from an NPZ file that was written with `save`."""
+        with np.load(path) as archive:
+            return cls(int(archive['num_frames']), archive['tiers'].tolist(), archive['vocabulary'].tolist(),
+                       archive['tier_offsets'], archive['starts'], archive['ends'], archive['codes'])
+
+    def save(self, path: str):
+        """Save the labels to an NPZ file."""
+        with open(path, 'wb') as output_file:
+            np.savez(output_file, num_frames=np.array(self.num_frames, dtype=np.int64),
+                     tiers=np.array(self.tiers, dtype=str), vocabulary=np.array(self.vocabulary, dtype=str),
+                     tier_offsets=self._tier_offsets, starts=self._starts, ends=self._ends, codes=self._codes)
+
+    def codes(self, tier: str) -> np.ndarray:
+        """Get the index of the label in the vocabulary of every frame for a tier, or -1 for frames without a label."""
+        t = self.tiers.index(tier)
+        frame_codes = np.full(self.num_frames, -1, dtype=np.int32)
+        for i in range(self._tier_offsets[t], self._tier_offsets[t + 1]):
+            frame_codes[self._starts[i]:self._ends[i]] = self._codes[i]
+        return frame_codes
+
+    def annotated(self) -> np.ndarray:
+        """Get a boolean mask of the frames that have a label in at least one tier."""
+        mask = np.zeros(self.num_frames, dtype=bool)
+        for start, end in zip(self._starts, self._ends):
+            mask[start:end] = True
+        return mask
+
+    def labels(self, tier: str) -> np.ndarray:
+        """Get the label of every frame for a tier, or `MISSING_LABEL` for frames without a label."""
+        lookup = np.array(self.vocabulary + [MISSING_LABEL], dtype=object)
+        return lookup[self.codes(tier)]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Get a DataFrame with a row per frame and a column per tier, as in the CSV format."""
+        label_dataframe = pd.DataFrame()
+        for tier in self.tiers:
+            label_dataframe[tier] = self.labels(tier)
+        return label_dataframe
+
+    def save_csv(self, path: str):
+        """Save the labels to a CSV file, with a row per frame and a column per tier."""
+        self.to_dataframe().to_csv(path, index=False)
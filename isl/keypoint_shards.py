@@ -0,0 +1,154 @@
+"""Pack the per-clip keypoint files into a few large shards, and read samples from these shards.
+
+A dataset with tens of thousands of clips results in as many keypoint files, and opening all of them (e.g., on a
+network file system) can take longer than the actual training. The packer writes the keypoints of all samples
+into a few contiguous data files instead, together with an index:
+    - shard_000.npy, shard_001.npy, ...: The keypoints of consecutive samples, concatenated along the frame axis.
+      Every shard is a regular NumPy array of shape (F, K, 3), which can be memory-mapped.
+    - index.npz: For every sample, its Id and the shard, frame offset and number of frames of its keypoints.
+Missing keypoints are NaN, as in the keypoint files."""
+import argparse
+import csv
+import os
+
+import numpy as np
+
+from keypoint_io import load_keypoints
+
+INDEX_FILE = 'index.npz'
+
+
+def main(args):
+    samples = []
+    missing = 0
+    with open(args.samples_csv) as samples_file:
+        # Id,Label,Participant,Video,Subset (from extract_clips.py).
+        for row in csv.DictReader(samples_file):
+            keypoint_path = _keypoint_path(args.keypoint_dir, row['Video'])
+            if keypoint_path is None:
+                missing += 1
+            else:
+                samples.append((row['Id'], keypoint_path))
+    if missing > 0:
+        print(f'No keypoint file found for {missing} samples; they are not packed.')
+
+    shard_files = pack_keypoints(samples, args.out_dir, args.shard_size * 1024 * 1024, np.dtype(args.dtype))
+    print(f'Packed {len(samples)} samples into {len(shard_files)} shards in {args.out_dir}.')
+
+
+def pack_keypoints(samples: [(str, str)], out_dir: str, shard_size: int, dtype: np.dtype = np.float32) -> [str]:
+    """Pack the keypoint files of the given samples into shards.
+
+    The number of frames of every sample is read first (without loading the keypoints of NPY files), so that every
+    shard can be written to a memory-mapped file, one sample at a time.
+
+    :param samples: Tuples of (sample Id, path to the keypoint file), in the order in which they should be stored.
+    :param out_dir: Output directory for the shards and the index.
+    :param shard_size: Maximum size of a shard in bytes. A sample that is larger than this gets a shard of its own.
+    :param dtype: Data type of the keypoints in the shards, e.g., float32 or float16.
+    :return: The file names of the shards."""
+    os.makedirs(out_dir, exist_ok=True)
+    shapes = [_keypoint_shape(path) for _sample_id, path in samples]
+    frame_shape = tuple(shapes[0][1:]) if len(shapes) > 0 else (0, 3)
+    frame_size = max(int(np.prod(frame_shape)) * dtype.itemsize, 1)
+
+    # Assign consecutive samples to shards.
+    shards = np.zeros(len(samples), dtype=np.int32)
+    offsets = np.zeros(len(samples), dtype=np.int64)
+    lengths = np.array([shape[0] for shape in shapes], dtype=np.int64)
+    shard_lengths = [0]
+    for i, length in enumerate(lengths):
+        if shard_lengths[-1] > 0 and (shard_lengths[-1] + length) * frame_size > shard_size:
+            shard_lengths.append(0)
+        shards[i] = len(shard_lengths) - 1
+        offsets[i] = shard_lengths[-1]
+        shard_lengths[-1] += int(length)
+
+    shard_files = [f'shard_{shard:03d}.npy' for shard in range(len(shard_lengths))]
+    for shard, shard_file in enumerate(shard_files):
+        data = np.lib.format.open_memmap(os.path.join(out_dir, shard_file), mode='w+', dtype=dtype,
+                                         shape=(shard_lengths[shard],) + frame_shape)
+        for i in np.flatnonzero(shards == shard):
+            data[offsets[i]:offsets[i] + lengths[i]] = load_keypoints(samples[i][1])
+        data.flush()
+        del data
+
+    np.savez(os.path.join(out_dir, INDEX_FILE),
+             ids=np.array([sample_id for sample_id, _path in samples], dtype=str),
+             shards=shards, offsets=offsets, lengths=lengths, shard_files=np.array(shard_files, dtype=str))
+    return shard_files
+
+
+class KeypointShards:
+    """Read the keypoints of samples from the shards written by `pack_keypoints`.
+
+    The shards are memory-mapped when they are first accessed, and the keypoints of a sample are returned as a view
+    into a shard, so no data is copied or read until it is used. The views are read-only."""
+
+    def __init__(self, directory: str):
+        """Open the shards in the given directory.
+
+        :param directory: The output directory of `pack_keypoints`."""
+        self.directory = directory
+        with np.load(os.path.join(directory, INDEX_FILE)) as index:
+            self.ids = index['ids'].tolist()
+            self._shards = index['shards']
+            self._offsets = index['offsets']
+            self._lengths = index['lengths']
+            self._shard_files = index['shard_files'].tolist()
+        self._rows = {sample_id: row for row, sample_id in enumerate(self.ids)}
+        self._data = [None] * len(self._shard_files)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, sample_id) -> bool:
+        return str(sample_id) in self._rows
+
+    def __getitem__(self, sample_id) -> np.ndarray:
+        """Get the keypoints of a sample, as a read-only view of shape (L, K, 3).
+
+        :param sample_id: The Id of the sample, as in the samples CSV file.
+        :raises KeyError: If there is no sample with this Id."""
+        row = self._rows[str(sample_id)]
+        shard = self._shards[row]
+        if self._data[shard] is None:
+            self._data[shard] = np.load(os.path.join(self.directory, self._shard_files[shard]), mmap_mode='r')
+        return self._data[shard][self._offsets[row]:self._offsets[row] + self._lengths[row]]
+
+    def num_frames(self, sample_id) -> int:
+        """Get the number of frames of a sample, without accessing its keypoints."""
+        return int(self._lengths[self._rows[str(sample_id)]])
+
+
+def _keypoint_path(keypoint_dir: str, video: str) -> str:
+    """Get the path to the keypoint file of a clip in any of the keypoint formats, or None if there is none."""
+    stem = os.path.splitext(os.path.basename(video))[0]
+    for extension in ('.npy', '.npz'):
+        path = os.path.join(keypoint_dir, stem + extension)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _keypoint_shape(path: str) -> (int, int, int):
+    """Get the shape of the keypoints in a keypoint file, without loading them if possible."""
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r').shape
+    with np.load(path) as archive:
+        return int(archive['num_frames']), int(np.sum(archive['part_sizes'])), 3
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('samples_csv', type=str, help='CSV file containing the samples (from extract_clips.py).')
+    parser.add_argument('keypoint_dir', type=str, help='Directory containing the keypoint files of the clips.')
+    parser.add_argument('out_dir', type=str, help='Output directory to which the shards and the index will be saved.')
+    parser.add_argument('--shard_size', type=int, default=1024, help='Maximum size of a shard in MiB.')
+    parser.add_argument('--dtype', type=str, choices=['float32', 'float16'], default='float32',
+                        help='Data type of the keypoints in the shards.')
+
+    args = parser.parse_args()
+
+    main(args)
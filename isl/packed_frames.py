@@ -0,0 +1,88 @@
+"""Store the JPEG-encoded frames of a video in a single data file with an index, instead of one image file per frame.
+
+Writing every frame of the corpus as a separate JPEG file results in millions of small files, and creating them is
+slower than decoding the videos on most (network) file systems. The packed format uses two files per video:
+    - <name>_frames.bin: The JPEG-encoded frames, concatenated in order of their frame index.
+    - <name>_frames.npz: For every stored frame, its frame index in the video and the offset of its JPEG data in the
+      data file (with a final offset for the end of the data file).
+The index is written when all frames have been written, so a video without an index was not packed completely.
+The data file is memory-mapped when it is read, so single frames can be decoded without reading the whole file."""
+import os
+
+import cv2
+import numpy as np
+
+DATA_SUFFIX = '_frames.bin'
+INDEX_SUFFIX = '_frames.npz'
+
+
+class PackedFramesWriter:
+    """Appends encoded frames to the data file of a video, and writes the index when it is closed."""
+
+    def __init__(self, path_base: str):
+        """Create a new PackedFramesWriter instance.
+
+        :param path_base: Path of the output files without the suffixes, e.g., <frames dir>/<video name>."""
+        self._index_path = path_base + INDEX_SUFFIX
+        self._data_file = open(path_base + DATA_SUFFIX, 'wb')
+        self._frame_indices = []
+        self._offsets = [0]
+
+    def write(self, frame_index: int, encoded: np.ndarray):
+        """Append an encoded frame (the output of `cv2.imencode`). Frames should be written in order."""
+        self._data_file.write(encoded.tobytes())
+        self._frame_indices.append(frame_index)
+        self._offsets.append(self._offsets[-1] + encoded.size)
+
+    def close(self):
+        self._data_file.close()
+        np.savez(self._index_path, frame_indices=np.array(self._frame_indices, dtype=np.int64),
+                 offsets=np.array(self._offsets, dtype=np.int64))
+
+    def __enter__(self) -> 'PackedFramesWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Do not write the index of an incomplete video.
+            self._data_file.close()
+
+
+class PackedFrames:
+    """Reads the frames of a video that were written with `PackedFramesWriter`."""
+
+    def __init__(self, path_base: str):
+        """Open the packed frames of a video.
+
+        :param path_base: Path of the files without the suffixes, as given to `PackedFramesWriter`."""
+        with np.load(path_base + INDEX_SUFFIX) as index:
+            self.frame_indices = index['frame_indices']
+            self._offsets = index['offsets']
+        data_path = path_base + DATA_SUFFIX
+        # An empty file cannot be memory-mapped.
+        if os.path.getsize(data_path) > 0:
+            self._data = np.memmap(data_path, dtype=np.uint8, mode='r')
+        else:
+            self._data = np.zeros(0, dtype=np.uint8)
+        self._positions = {int(frame_index): i for i, frame_index in enumerate(self.frame_indices)}
+
+    def __len__(self) -> int:
+        return len(self.frame_indices)
+
+    def __contains__(self, frame_index: int) -> bool:
+        return frame_index in self._positions
+
+    def encoded(self, frame_index: int) -> np.ndarray:
+        """Get the JPEG data of a frame.
+
+        :raises KeyError: If the frame was not stored."""
+        i = self._positions[frame_index]
+        return self._data[self._offsets[i]:self._offsets[i + 1]]
+
+    def read(self, frame_index: int) -> np.ndarray:
+        """Decode a frame to a BGR image, as `cv2.imread` would for a JPEG file.
+
+        :raises KeyError: If the frame was not stored."""
+        return cv2.imdecode(np.asarray(self.encoded(frame_index)), cv2.IMREAD_COLOR)
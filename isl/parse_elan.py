@@ -1,4 +1,5 @@
 from pympi.Elan import Eaf as eaf
+import numpy as np
 import pandas as pd
 import json
 import glob
@@ -6,6 +7,8 @@ import cv2
 import os
 import argparse
 
+from probe_cache import ProbeCache
+
 def _elan_to_dict(annotation_filename):
     '''
     Converts an ELAN annotation file to a dictionary. 
@@ -53,6 +56,55 @@ def _elan_to_dict(annotation_filename):
                       }
 
 
+def _frame_ms_values(num_frames, FPS):
+    '''
+    Computes the millisecond value of every frame in a video.
+    
+    Parameters
+    ----------
+    num_frames : int
+        Number of frames in the video.
+    FPS : float
+        Frames per second of the video.
+    
+    Returns
+    -------
+    frame_ms_vals : np.ndarray
+        Array of length num_frames with the (non-decreasing) millisecond value of every frame: 
+        frame index (i.e. frame number) / frames per second = fraction of a second that the frame is at, 
+        and multiplying by 1000 tells us at what millisecond the frame is at. 
+    '''
+    return ((np.arange(1, num_frames + 1) / FPS) * 1000).astype(np.int64)
+
+
+def _annotations_in_video(start_times, end_times, frame_ms_vals, last_frame_ms_val):
+    '''
+    Checks for every annotation of a tier whether it is in the video. 
+    An annotation is in the video if there is a frame with a millisecond value within [start_time, end_time]
+    (there are some situations where the label is actually somehow BETWEEN frames), and if the label does
+    not go beyond the end of the video itself. 
+    
+    Parameters
+    ----------
+    start_times, end_times : np.ndarray
+        Start and end times (ms) of the annotations. 
+    frame_ms_vals : np.ndarray
+        Millisecond value of every frame, see _frame_ms_values. 
+    last_frame_ms_val : int
+        Millisecond value of the end of the video. 
+    
+    Returns
+    -------
+    in_video : np.ndarray
+        Boolean array, True for the annotations that are in the video. 
+    '''
+    # Index of the first frame at or after the start of every annotation. 
+    first_frame_idx = np.searchsorted(frame_ms_vals, start_times, side='left')
+    has_frame = first_frame_idx < len(frame_ms_vals)
+    first_frame_ms_val = frame_ms_vals[np.minimum(first_frame_idx, len(frame_ms_vals) - 1)]
+    return has_frame & (first_frame_ms_val <= end_times) & (end_times < last_frame_ms_val)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
 
@@ -60,9 +112,13 @@ if __name__ == '__main__':
     parser.add_argument('--video_root', type=str, help='Root dir of the SoI corpus video files.')
     parser.add_argument('--json_out', type=str, help='Output .json file of parsed results.')
     parser.add_argument('--errors_out', type=str, help='Output .csv file of errors.')
+    parser.add_argument('--probe_cache', type=str, default=None,
+                        help='Optional: JSON file with cached ffprobe video metadata (shared with extract_clips.py).')
 
     args = parser.parse_args()
 
+    probe_cache = ProbeCache(args.probe_cache) if args.probe_cache is not None else None
+
     error_video_files = []
     exceptions = []
 
@@ -99,55 +155,49 @@ if __name__ == '__main__':
                 if  not os.path.isfile(video_path):
                     raise Exception("File does not exist!")
             # Check if video loads correctly (i.e. not corrupted).
-            video = cv2.VideoCapture(video_path)
-            FPS = video.get(cv2.CAP_PROP_FPS)
+            if probe_cache is not None:
+                # Use the cached ffprobe metadata, which is shared with the other pipeline stages.
+                video_metadata = probe_cache.get(video_path)
+                if video_metadata is None:
+                    raise Exception("File did not load correctly, ffprobe failed.")
+                FPS = video_metadata["fps"]
+                num_frames = int(video_metadata["frame_count"])
+            else:
+                video = cv2.VideoCapture(video_path)
+                FPS = video.get(cv2.CAP_PROP_FPS)
+                num_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+                video.release()
             file_annotation_dict["fps"] = FPS
-            num_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
             # If no frames are loaded (video empty or fails silently) raise exception. 
             if num_frames == 0:
                 raise Exception("File did not load correctly, no frames returned.")
-            video.release()
 
+            # Frame timestamps, computed when the first non-empty tier is checked.
+            frame_ms_vals = None
             # Iterate over each tier of annoations. 
             for tier_name in file_annotation_dict["annotations"].keys():
-                # list for all the annotation in this tier. 
-                tier_annotation_list = []
-                # Iterate over all the annotations in this tier
-                for anno_i in file_annotation_dict["annotations"][tier_name]:
-                    # Check if annotation is in the video. 
-                    anno_in_vid = False
-                    # Annotations are in the following format [start_fime, end_time, label]
-                    start_time = int(anno_i[0])
-                    end_time = int(anno_i[1])
-                    # This calculates the millisecond value of the last frame in the video 
-                    # (explanation on line 116)
-                    last_frame_idx = num_frames
-                    last_frame_ms_val = int((last_frame_idx/FPS)*1000)
-                    for i in range(int(num_frames)):         
-                        # frame index (i.e. frame number)/ frames per second = fraction of a second 
-                        # that the current frame is at.
-                        # Obviously 1000 = number of milliseconds per second so multiplying by 
-                        # 1000 tells us at what millisecond the frame is at.
-                        # This means that we go to the part of the video where the sign starts.
-                        ms_val = int(((i+1)/FPS)*1000)
-                        # There are some situations where the label is actually somehow BETWEEN frames for some reason. 
-                        # The label should also not go beyond the end of the video itself. 
-                        if (ms_val >= start_time) and (ms_val <= end_time) and not (end_time >= last_frame_ms_val):
-                            anno_in_vid = True
-                    # This is necessary to avoid errors when labels have been misaligned,
-                    # i.e. their are no frames within the time period the annotation describes,
-                    # This could be due to low framerate or, more likely, due to misalignment for 
-                    # annotations of events occuring for a very short period of time. 
-                    if anno_in_vid :
-                        tier_annotation_list.append(anno_i)
-                    else:
-                        misaligned_annotations[tier_name].append(anno_i)
+                tier_annotations = file_annotation_dict["annotations"][tier_name]
+                # Annotations are in the following format [start_fime, end_time, label]
+                start_times = np.array([int(anno_i[0]) for anno_i in tier_annotations], dtype=np.int64)
+                end_times = np.array([int(anno_i[1]) for anno_i in tier_annotations], dtype=np.int64)
+                if len(tier_annotations) > 0 and frame_ms_vals is None:
+                    frame_ms_vals = _frame_ms_values(num_frames, FPS)
+                    # This calculates the millisecond value of the last frame in the video. 
+                    last_frame_ms_val = int((num_frames/FPS)*1000)
+                # Check which annotations are in the video (see _annotations_in_video). 
+                # This is necessary to avoid errors when labels have been misaligned,
+                # i.e. their are no frames within the time period the annotation describes,
+                # This could be due to low framerate or, more likely, due to misalignment for 
+                # annotations of events occuring for a very short period of time. 
+                in_video = np.zeros(0, dtype=bool) if len(tier_annotations) == 0 else \
+                    _annotations_in_video(start_times, end_times, frame_ms_vals, last_frame_ms_val)
                 # Replace annotations with those without the misaligned annotations. 
-                file_annotation_dict["annotations"][tier_name] = tier_annotation_list
+                file_annotation_dict["annotations"][tier_name] = [anno_i for anno_i, keep in zip(tier_annotations, in_video) if keep]
+                misaligned_annotations[tier_name] = [anno_i for anno_i, keep in zip(tier_annotations, in_video) if not keep]
                 # Add the list of misaligned annotations from this EAF file to the new annotation dictionary. 
                 file_annotation_dict["misaligned_annotations"] = misaligned_annotations
                 # Add new cleaned annotation dictionary to the overall annotation dictionary
-                # under the name of the original EAF file. 
+                # under the name of the original EAF file. 
                 eaf_files_dict[annotation_filename] = file_annotation_dict
         # If an exception occurs, flag this and collect the name of the video within which this occured and
         # a description of the error that occured. 
@@ -156,6 +206,9 @@ if __name__ == '__main__':
             error_video_files.append(video_path)
             exceptions.append(e)
 
+    if probe_cache is not None:
+        probe_cache.save()
+
     #3. Save errors to a CSV:
     df = pd.DataFrame(index=error_video_files)
     df["error"] = exceptions
@@ -0,0 +1,140 @@
+"""Perform human pose estimation using MediaPipe Holistic for many clips, using a pool of long-lived worker processes.
+
+This is an alternative to running pose_estimation.py once per clip. Every worker builds a single MediaPipe Holistic
+instance and reuses it for all of its clips (resetting the tracking state in between), so that the interpreter
+startup, the import of MediaPipe and the construction of the Holistic graph are only paid once per worker."""
+import argparse
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from keypoint_io import OUTPUT_FORMATS, extension, save_keypoints
+from pose_estimation import create_holistic, run_mediapipe
+
+_holistic = None  # The Holistic instance of the current worker process, see `_init_worker`.
+
+
+def main(args):
+    clips = collect_clips(args.clips, args.clip_list)
+    jobs = []
+    for clip in clips:
+        # Same file name as pose_estimation.py.
+        output_path = os.path.join(args.out_dir, os.path.basename(clip).replace('.mp4', extension(args.output_format)))
+        if not os.path.isfile(output_path):
+            jobs.append((clip, output_path, args.output_format))
+    print(f'Extracting keypoints for {len(jobs)} clips ({len(clips) - len(jobs)} already done).')
+
+    report = _ThroughputReport(len(jobs), args.report_every)
+    if args.jobs <= 1:
+        _init_worker()
+        for job in jobs:
+            report.update(*_process_clip(*job))
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker) as executor:
+            # The queue of submitted clips is bounded, so that results are reported while the pool is running.
+            pending = set()
+            for job in jobs:
+                if len(pending) >= 2 * args.jobs:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        report.update(*future.result())
+                pending.add(executor.submit(_process_clip, *job))
+            for future in pending:
+                report.update(*future.result())
+    report.print_summary()
+
+
+def collect_clips(paths: [str], clip_list: str = None) -> [str]:
+    """Get the paths to the clips given on the command line.
+
+    :param paths: Paths to clips, or to directories that are searched recursively for MP4 clips.
+    :param clip_list: Path to a text file with the path to a clip on every line, or None.
+    :return: The paths to the clips, in a sorted order for every directory."""
+    clips = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _dirs, files in sorted(os.walk(path)):
+                clips.extend(os.path.join(root, f) for f in sorted(files) if f.endswith('.mp4'))
+        else:
+            clips.append(path)
+    if clip_list is not None:
+        with open(clip_list) as clip_list_file:
+            clips.extend(line.strip() for line in clip_list_file if line.strip() != '')
+    return clips
+
+
+def _init_worker():
+    global _holistic
+    _holistic = create_holistic()
+
+
+def _process_clip(clip: str, output_path: str, output_format: str) -> (str, int, str):
+    """Extract the keypoints of a single clip with the Holistic instance of this worker, and save them.
+
+    An error in a single clip (a missing file, or a MediaPipe, decoding or saving error) is returned instead of
+    raised, so that the other clips are still processed.
+
+    :return: The clip, the number of frames and an error message (None if the clip was processed successfully)."""
+    try:
+        _holistic.reset()
+        keypoints = run_mediapipe(clip, _holistic)
+        save_keypoints(output_path, keypoints, output_format)
+    except Exception as e:
+        # Do not leave a partially written file, which would be skipped in the next run.
+        if os.path.isfile(output_path):
+            os.remove(output_path)
+        return clip, 0, f'Failed to process {clip}: {type(e).__name__}: {e}'
+    return clip, len(keypoints), None
+
+
+class _ThroughputReport:
+    """Keeps track of the number of processed clips and frames, and prints the throughput."""
+
+    def __init__(self, num_clips: int, report_every: int):
+        self.num_clips = num_clips
+        self.report_every = report_every
+        self.done = 0
+        self.failed = 0
+        self.frames = 0
+        self.start_time = time.perf_counter()
+
+    def update(self, clip: str, num_frames: int, error: str):
+        self.done += 1
+        self.frames += num_frames
+        if error is not None:
+            self.failed += 1
+            print(error)
+        if self.report_every > 0 and self.done % self.report_every == 0:
+            print(self._throughput())
+
+    def print_summary(self):
+        if self.report_every <= 0 or self.done % self.report_every != 0:  # Otherwise, it was printed by `update`.
+            print(self._throughput())
+        if self.failed > 0:
+            print(f'{self.failed} of {self.num_clips} clips failed.')
+
+    def _throughput(self) -> str:
+        elapsed = time.perf_counter() - self.start_time
+        return (f'{self.done}/{self.num_clips} clips in {elapsed:.1f}s: '
+                f'{self.done / max(elapsed, 1e-9):.2f} clips/s, {self.frames / max(elapsed, 1e-9):.1f} frames/s.')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--clips', type=str, nargs='*', default=[],
+                        help='Paths to the videos from which we will extract MediaPipe features, '
+                             'or directories containing these videos.')
+    parser.add_argument('--out_dir', type=str, help='Output directory to which MediaPipe features will be saved.')
+    parser.add_argument('--clip_list', type=str, help='Text file containing the path to a video on every line.')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of parallel worker processes.')
+    parser.add_argument('--report_every', type=int, default=100,
+                        help='Print the throughput after every this many clips (0 to only print it at the end).')
+
+    parser.add_argument('--output_format', type=str, choices=OUTPUT_FORMATS, default='npy',
+                        help='Format of the keypoint files: npy (float32), or the compact float16 or uint16 formats '
+                             '(NPZ files with a presence mask per body part, see keypoint_io.py).')
+
+    args = parser.parse_args()
+
+    main(args)
@@ -4,6 +4,9 @@ import numpy as np
 import pandas as pd
 import argparse
 
+# Name of a frame written by write_frames.py, e.g. "03 - Personal - Noeleen (Dublin) (Converted)_frame_12.jpg".
+FRAME_NAME_PATTERN = r'^(?P<video>.*)_frame_(?P<frame_num>\d+)\.jpg$'
+
 def gloss_dict_to_df(video_dict):
     '''Put gloss information into a dataframe.
     params: 
@@ -92,12 +95,15 @@ def get_frame_ms(df, FPS):
         - "frame_ms": The millisecond timestamp at the frame. 
     '''
     df = df.reset_index()
-    # Isolate frame number from jpg name
-    df["frame_num"] = df["index"].str.split('_').apply(lambda x: x[-1])
-    # Remove ".jpg" file extension
-    df["frame_num"] = df.frame_num.str.split('.').apply(lambda x: x[0]).astype(int)
-    df["video"] = df["index"].str.replace("_frame_\d.jpg", "", regex=True)
-    df["frame_ms"] = (df.frame_num/FPS)*1000
+    # Isolate the video name and the frame number from the jpg name ("<video>_frame_<frame number>.jpg", see 
+    # write_frames.py) in a single pass. 
+    parts = df["index"].str.extract(FRAME_NAME_PATTERN)
+    if parts["frame_num"].isna().any():
+        invalid = df["index"][parts["frame_num"].isna()].iloc[0]
+        raise ValueError(f"Frame name {invalid} does not have the form <video>_frame_<frame number>.jpg")
+    df["frame_num"] = parts["frame_num"].to_numpy().astype(int)
+    df["video"] = parts["video"]
+    df["frame_ms"] = (df["frame_num"].to_numpy()/np.asarray(FPS))*1000
     return df
 
 def get_participant_name(glosses):
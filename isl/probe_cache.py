@@ -0,0 +1,144 @@
+import os
+import json
+import subprocess
+
+from clip_scheduler import run_jobs
+
+
+class ProbeCache:
+    """
+    On-disk cache of video metadata obtained with ffprobe, shared by the pipeline stages that need video metadata.
+
+    Every entry is keyed by the video path and is only valid as long as the size and the modification time of the
+    video do not change. An entry contains the following fields:
+        - width, height: Frame size of the first video stream.
+        - fps: Frame rate of the first video stream.
+        - duration: Duration in seconds.
+        - frame_count: Number of frames.
+        - keyframes: Timestamps (in seconds, relative to the start of the video) of the keyframes. Only present if
+          they were requested, because all packets of the video have to be read to find them.
+    Videos that can not be probed (e.g., missing or corrupted files) are never cached: they are probed again by the
+    next run. Within a run, they are only probed once.
+    """
+
+    def __init__(self, cache_path=None):
+        """
+        Parameters:
+        -----------
+        cache_path: str
+            Path to the JSON cache file. If None, the metadata is only cached in memory.
+        """
+        self._cache_path = cache_path
+        self._entries = dict()
+        #Videos that could not be probed by this instance, which are not saved:
+        self._failed = set()
+        if cache_path is not None and os.path.isfile(cache_path):
+            with open(cache_path) as f:
+                self._entries = json.load(f)
+
+    def get(self, video_path, keyframes=False):
+        """
+        Get the metadata of a video, probing it if it is not in the cache (or if it has changed).
+        Newly probed entries are only written to disk by `save`.
+        Returns None if the video can not be probed.
+        """
+        if video_path in self._failed:
+            return None
+        if not self._is_cached(video_path, keyframes):
+            self._store(video_path, probe_video(video_path, keyframes))
+        return self._entries.get(video_path)
+
+    def probe_all(self, video_paths, num_workers=1, keyframes=False):
+        """
+        Probe all videos that are not in the cache with `num_workers` parallel ffprobe processes, and save the cache.
+        Returns the videos that can not be probed.
+        """
+        missing = sorted(set(p for p in video_paths if p not in self._failed and not self._is_cached(p, keyframes)))
+        results = run_jobs(probe_video, [(p, keyframes) for p in missing], missing, num_workers)
+        for video_path, metadata in zip(missing, results):
+            self._store(video_path, metadata)
+        if len(missing) > 0:
+            self.save()
+        return sorted(self._failed.intersection(video_paths))
+
+    def save(self):
+        if self._cache_path is not None:
+            with open(self._cache_path, 'w') as f:
+                json.dump(self._entries, f)
+
+    def _store(self, video_path, metadata):
+        if metadata is None:
+            self._failed.add(video_path)
+            self._entries.pop(video_path, None)
+            return
+        stat = os.stat(video_path)
+        metadata['size'] = stat.st_size
+        metadata['mtime_ns'] = stat.st_mtime_ns
+        self._entries[video_path] = metadata
+
+    def _is_cached(self, video_path, keyframes=False):
+        entry = self._entries.get(video_path)
+        #Cache files of older versions may contain failed probes, with a frame size of 0.
+        if entry is None or entry.get('width', 0) <= 0 or not os.path.isfile(video_path):
+            return False
+        if keyframes and 'keyframes' not in entry:
+            return False
+        stat = os.stat(video_path)
+        return entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns
+
+
+def probe_video(video_path, keyframes=False):
+    """
+    Read the metadata of a video with a single ffprobe call. No frames are decoded, and the packets are only read if
+    `keyframes` is True.
+    Returns None if the video can not be probed, or if it has no video stream with a frame size.
+    """
+    show_entries = "stream=width,height,r_frame_rate,avg_frame_rate,nb_frames,duration:format=duration,start_time"
+    if keyframes:
+        show_entries += ":packet=pts_time,flags"
+    res = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", show_entries,
+                          "-of", "json", video_path], capture_output=True, text=True)
+    if res.returncode != 0:
+        return None
+    try:
+        probe = json.loads(res.stdout)
+    except ValueError:
+        return None
+    streams = probe.get('streams', [])
+    stream = streams[0] if len(streams) > 0 else dict()
+    width, height = int(stream.get('width', 0)), int(stream.get('height', 0))
+    if width <= 0 or height <= 0:
+        return None
+    video_format = probe.get('format', dict())
+
+    #Frame rate and frame count are determined in the same way as OpenCV does:
+    fps = _parse_rate(stream.get('r_frame_rate')) or _parse_rate(stream.get('avg_frame_rate'))
+    duration = _parse_float(stream.get('duration')) or _parse_float(video_format.get('duration'))
+    frame_count = int(_parse_float(stream.get('nb_frames'))) or int(round(duration * fps))
+    metadata = {'width': width,
+                'height': height,
+                'fps': fps,
+                'duration': duration,
+                'frame_count': frame_count}
+
+    if keyframes:
+        #Keyframe timestamps, relative to the start time of the container (as used for seeking by ffmpeg):
+        start_time = _parse_float(video_format.get('start_time'))
+        metadata['keyframes'] = sorted(float(p['pts_time']) - start_time for p in probe.get('packets', [])
+                                       if 'K' in p.get('flags', '') and p.get('pts_time', 'N/A') != 'N/A')
+    return metadata
+
+
+def _parse_rate(rate):
+    #Rates are given as fractions, e.g., "30000/1001".
+    if rate is None or '/' not in rate:
+        return _parse_float(rate)
+    numerator, denominator = rate.split('/')
+    return float(numerator) / float(denominator) if float(denominator) != 0 else 0.0
+
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
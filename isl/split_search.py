@@ -0,0 +1,265 @@
+"""Search for the participant split (train/val/test) with the largest number of glosses that occur in all three subsets.
+
+There are two approaches:
+    - `search_seeds`: A random search over the seeds of `create_dataset._split_on_participant`. Instead of splitting
+      the DataFrame for every seed, a participant x gloss incidence matrix is computed once, and every candidate split
+      is scored with bitwise operations on the (bit-packed) rows of its participants. The seeds are scored in batches,
+      optionally in a pool of worker processes, until all seeds have been tried, the time budget is spent, or the
+      target score is reached.
+    - `optimize_split`: A deterministic greedy construction followed by a local search on the participant x gloss
+      count matrix. It usually finds a better split than the random search in a fraction of the time, but the split
+      does not correspond to a seed."""
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+# Number of set bits in every byte value.
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+_scorer = None  # The SplitScorer of the current worker process, see `_init_worker`.
+
+
+def count_matrix(df: pd.DataFrame, participant_column: str = 'participant') -> (np.ndarray, np.ndarray, np.ndarray):
+    """Count the samples of every gloss for every participant.
+
+    :param df: The samples, with the columns gloss and `participant_column`.
+    :param participant_column: The column by which the samples are split.
+    :return: The participants (sorted, as in `_split_on_participant`), the glosses and an integer matrix of shape
+        (participants, glosses). The incidence matrix of the other functions is `counts > 0`."""
+    participants, participant_codes = np.unique(df[participant_column].values, return_inverse=True)
+    gloss_codes, glosses = pd.factorize(df.gloss, use_na_sentinel=False)
+    counts = np.zeros((len(participants), len(glosses)), dtype=np.int64)
+    np.add.at(counts, (participant_codes, gloss_codes), 1)
+    return participants, np.asarray(glosses), counts
+
+
+def subset_sizes(num_participants: int, eval_size: float) -> (int, int, int):
+    """Get the number of train, validation and test participants of the splits of `_split_on_participant`."""
+    train, evaluation = train_test_split(np.arange(num_participants), test_size=eval_size, random_state=1)
+    val, test = train_test_split(evaluation, test_size=0.5, random_state=1)
+    return len(train), len(val), len(test)
+
+
+def upper_bound(incidence: np.ndarray) -> int:
+    """Get the number of glosses that occur for at least three participants, which no split can exceed."""
+    return int(np.count_nonzero(incidence.sum(axis=0) >= 3))
+
+
+class SplitScorer:
+    """Reproduces the participant splits of `_split_on_participant` for given seeds, and scores them.
+
+    `train_test_split` shuffles with `RandomState(seed).permutation`, and the subset sizes do not depend on the seed.
+    The sizes are therefore taken from `train_test_split` once, and the permutations are computed with a single
+    RandomState that is seeded again for every split (which is much faster than creating a new one). This is checked
+    against `train_test_split` when the scorer is created; if the results differ, `train_test_split` is used."""
+
+    def __init__(self, incidence: np.ndarray, eval_size: float):
+        """Create a new SplitScorer instance.
+
+        :param incidence: The participant x gloss incidence matrix, see `count_matrix`.
+        :param eval_size: The fraction of the participants in the validation and test sets together."""
+        self.eval_size = eval_size
+        self._packed = np.packbits(incidence, axis=1)
+        self._num_participants = len(incidence)
+        self._random_state = np.random.RandomState()
+        _num_train, num_val, self._num_test = subset_sizes(self._num_participants, eval_size)
+        self._num_eval = num_val + self._num_test
+        self._exact = all(np.array_equal(a, b) for a, b in zip(self._slow_split(1), self._fast_split(1)))
+
+    def split(self, seed: int) -> (np.ndarray, np.ndarray, np.ndarray):
+        """Get the indices of the train, validation and test participants for a seed."""
+        return self._fast_split(seed) if self._exact else self._slow_split(seed)
+
+    def score(self, seed: int) -> int:
+        """Get the number of glosses that occur in all three subsets of the split for a seed."""
+        common = None
+        for subset in self.split(seed):
+            present = np.bitwise_or.reduce(self._packed[subset], axis=0)
+            common = present if common is None else common & present
+        return int(_POPCOUNT[common].sum())
+
+    def _slow_split(self, seed: int) -> (np.ndarray, np.ndarray, np.ndarray):
+        train, evaluation = train_test_split(np.arange(self._num_participants), test_size=self.eval_size,
+                                             random_state=seed)
+        val, test = train_test_split(evaluation, test_size=0.5, random_state=seed)
+        return train, val, test
+
+    def _fast_split(self, seed: int) -> (np.ndarray, np.ndarray, np.ndarray):
+        self._random_state.seed(seed)
+        permutation = self._random_state.permutation(self._num_participants)
+        evaluation = permutation[:self._num_eval]
+        train = permutation[self._num_eval:]
+        self._random_state.seed(seed)
+        eval_permutation = self._random_state.permutation(self._num_eval)
+        test = evaluation[eval_permutation[:self._num_test]]
+        val = evaluation[eval_permutation[self._num_test:]]
+        return train, val, test
+
+
+@dataclass
+class SearchResult:
+    seed: int  # The first seed with the highest score.
+    score: int  # The number of glosses that occur in all three subsets.
+    trials: int  # The number of seeds that were scored.
+    seconds: float
+
+
+def search_seeds(incidence: np.ndarray, seeds: [int], eval_size: float, num_workers: int = 1, batch_size: int = 1000,
+                 time_budget: float = None, target_score: int = None) -> SearchResult:
+    """Score the splits for the given seeds, and get the (first) seed with the highest score.
+
+    :param incidence: The participant x gloss incidence matrix, see `count_matrix`.
+    :param seeds: The seeds to try, in order.
+    :param eval_size: The fraction of the participants in the validation and test sets together.
+    :param num_workers: The number of worker processes. With a single worker, the seeds are scored in this process.
+    :param batch_size: The number of seeds that are scored per job.
+    :param time_budget: Stop submitting seeds after this many seconds (None: no limit).
+    :param target_score: Stop submitting seeds when a split with at least this score has been found. Defaults to the
+        `upper_bound` of the score.
+    :return: The best seed and its score. Among seeds with the same score, the first one is returned (even with multiple
+        workers, all seeds before it have been scored)."""
+    start_time = time.perf_counter()
+    if target_score is None:
+        target_score = upper_bound(incidence)
+    batches = [(offset, seeds[offset:offset + batch_size]) for offset in range(0, len(seeds), batch_size)]
+
+    best = (-1, 0)  # (score, -index).
+    trials = 0
+
+    def _update(result):
+        nonlocal best, trials
+        batch_best, batch_trials = result
+        best = max(best, batch_best)
+        trials += batch_trials
+
+    def _stop() -> bool:
+        out_of_time = time_budget is not None and time.perf_counter() - start_time > time_budget
+        return out_of_time or best[0] >= target_score
+
+    if num_workers <= 1:
+        _init_worker(incidence, eval_size)
+        for offset, batch in batches:
+            if _stop():
+                break
+            _update(_score_batch(offset, batch))
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker,
+                                 initargs=(incidence, eval_size)) as executor:
+            pending = set()
+            for offset, batch in batches:
+                if len(pending) >= 2 * num_workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        _update(future.result())
+                if _stop():
+                    break
+                pending.add(executor.submit(_score_batch, offset, batch))
+            for future in pending:
+                _update(future.result())
+
+    if trials == 0:
+        raise ValueError('No seeds were scored.')
+    return SearchResult(seeds[-best[1]], best[0], trials, time.perf_counter() - start_time)
+
+
+@dataclass
+class OptimizedSplit:
+    train: np.ndarray  # Indices of the participants in every subset.
+    val: np.ndarray
+    test: np.ndarray
+    score: int  # The number of glosses that occur in all three subsets.
+    seconds: float
+
+
+def optimize_split(counts: np.ndarray, eval_size: float, max_swaps: int = 10000) -> OptimizedSplit:
+    """Find a participant split with many glosses in common deterministically, instead of trying random seeds.
+
+    The subsets have the same sizes as those of `_split_on_participant`. Splits are compared by the number of glosses
+    that occur in all three subsets, and then (to break ties) by the number of samples of these glosses.
+    First, a split is built greedily: starting with all participants in the training set, the test and validation
+    sets are filled in turns, every time with the participant whose move results in the best split (counting the
+    glosses that occur in all non-empty subsets). Then, the split is improved by a local search, which swaps the two
+    participants of different subsets that improve the split the most, until no swap improves it.
+
+    :param counts: The participant x gloss count matrix, see `count_matrix`.
+    :param eval_size: The fraction of the participants in the validation and test sets together.
+    :param max_swaps: The maximum number of swaps of the local search.
+    :return: The split and its score."""
+    start_time = time.perf_counter()
+    presence = counts > 0
+    # Only glosses that occur for at least three participants can occur in all subsets.
+    candidate_glosses = presence.sum(axis=0) >= 3
+    presence = presence[:, candidate_glosses].astype(np.int32)
+    totals = counts[:, candidate_glosses].sum(axis=0)
+    # A gloss in common is worth more than all samples of all glosses together.
+    weights = totals + totals.sum() + 1
+
+    num_train, num_val, num_test = subset_sizes(len(counts), eval_size)
+    assignment = np.zeros(len(counts), dtype=np.int32)  # 0: train, 1: val, 2: test.
+    participants_per_gloss = np.zeros((3, presence.shape[1]), dtype=np.int32)  # Per subset.
+    participants_per_gloss[0] = presence.sum(axis=0)
+
+    # Greedy construction.
+    fill_order = []  # Test and validation in turns.
+    while fill_order.count(2) < num_test or fill_order.count(1) < num_val:
+        if fill_order.count(2) < num_test:
+            fill_order.append(2)
+        if fill_order.count(1) < num_val:
+            fill_order.append(1)
+    for subset in fill_order:
+        candidates = np.flatnonzero(assignment == 0)
+        common = ((participants_per_gloss[0] - presence[candidates]) > 0) & \
+                 ((participants_per_gloss[subset] + presence[candidates]) > 0)
+        other = 3 - subset
+        if np.any(assignment == other):
+            common &= participants_per_gloss[other] > 0
+        participant = candidates[np.argmax(common @ weights)]
+        assignment[participant] = subset
+        participants_per_gloss[0] -= presence[participant]
+        participants_per_gloss[subset] += presence[participant]
+
+    # Local search.
+    value = np.all(participants_per_gloss > 0, axis=0) @ weights
+    for _ in range(max_swaps):
+        best_value, best_swap = value, None
+        for participant in range(len(assignment)):
+            a = assignment[participant]
+            for b in range(a + 1, 3):
+                others = np.flatnonzero(assignment == b)
+                delta = presence[others] - presence[participant]  # Change of subset a for every swap.
+                common = ((participants_per_gloss[a] + delta) > 0) & ((participants_per_gloss[b] - delta) > 0) & \
+                         (participants_per_gloss[3 - a - b] > 0)
+                values = common @ weights
+                if len(values) > 0 and values.max() > best_value:
+                    best_value, best_swap = values.max(), (participant, others[np.argmax(values)])
+        if best_swap is None:
+            break
+        value = best_value
+        p, q = best_swap
+        a, b = assignment[p], assignment[q]
+        participants_per_gloss[a] += presence[q] - presence[p]
+        participants_per_gloss[b] += presence[p] - presence[q]
+        assignment[p], assignment[q] = b, a
+
+    score = int(np.count_nonzero(np.all(participants_per_gloss > 0, axis=0)))
+    return OptimizedSplit(np.flatnonzero(assignment == 0), np.flatnonzero(assignment == 1),
+                          np.flatnonzero(assignment == 2), score, time.perf_counter() - start_time)
+
+
+def _init_worker(incidence: np.ndarray, eval_size: float):
+    global _scorer
+    _scorer = SplitScorer(incidence, eval_size)
+
+
+def _score_batch(offset: int, seeds: [int]) -> ((int, int), int):
+    """Score a batch of seeds with the SplitScorer of this worker.
+
+    :return: The best (score, -index) in the batch, where index is the position of the seed in the list of all seeds,
+        and the number of scored seeds."""
+    scores = np.array([_scorer.score(seed) for seed in seeds])
+    index = int(np.argmax(scores))
+    return (int(scores[index]), -(offset + index)), len(seeds)
@@ -1,9 +1,158 @@
-import numpy as np 
-import pandas as pd
+import numpy as np
 import json
 import cv2
 import os
 import argparse
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+from frame_labels import FrameLabels, LABEL_FORMATS, extension
+from packed_frames import PackedFramesWriter
+
+FRAME_FORMATS = ('jpg', 'packed')
+
+
+def _encode_frame(frame, jpg_path=None):
+    '''
+    Encodes a frame as JPEG. This is run in a thread pool: OpenCV releases the GIL while encoding.
+
+    Parameters
+    ----------
+    frame : np.ndarray
+        BGR frame as returned by cv2.VideoCapture.read.
+    jpg_path : str
+        If given, the JPEG is written to this file (as cv2.imwrite would) and None is returned.
+
+    Returns
+    -------
+    encoded : np.ndarray
+        The JPEG data, if jpg_path is None.
+    '''
+    return_val, encoded = cv2.imencode('.jpg', frame)
+    assert return_val == True
+    if jpg_path is None:
+        return encoded
+    encoded.tofile(jpg_path)
+
+
+def _write_video_frames(video_path, new_frames_dir, filename, write_mask, frame_format, executor, max_pending):
+    '''
+    Writes the frames of a video for which write_mask is True.
+
+    Parameters
+    ----------
+    video_path : str
+        Path of the video file.
+    new_frames_dir : str
+        Output directory for the frames of this video.
+    filename : str
+        Video filename without file extension, which is used to name the frames.
+    write_mask : np.ndarray
+        Boolean array with an entry for every frame of the video.
+    frame_format : str
+        'jpg' to write a JPEG file per frame, or 'packed' to write all frames into one file (see packed_frames.py).
+    executor : ThreadPoolExecutor
+        Thread pool in which the frames are encoded.
+    max_pending : int
+        Maximum number of decoded frames that are waiting to be encoded.
+
+    Returns
+    -------
+    frames_written : int
+        Number of frames that were written.
+    '''
+    video = cv2.VideoCapture(video_path)
+    frame_indices = np.flatnonzero(write_mask)
+    # Frames after the last frame to write do not need to be decoded.
+    num_frames = frame_indices[-1] + 1 if len(frame_indices) > 0 else 0
+    # Encoding jobs in order of their frame index, so that packed frames are written in order.
+    pending = deque()
+    # The packed frames writer writes its index when the block is left without an exception, i.e., when all frames
+    # have been written. Otherwise, only its data file is closed.
+    if frame_format == 'packed':
+        packed_frames = PackedFramesWriter(os.path.join(new_frames_dir, filename))
+    else:
+        packed_frames = nullcontext()
+    with packed_frames as packed_writer:
+
+        def _finish_oldest():
+            frame_i, future = pending.popleft()
+            encoded = future.result()
+            if packed_writer is not None:
+                packed_writer.write(frame_i, encoded)
+
+        try:
+            for i in range(num_frames):
+                if not write_mask[i]:
+                    # Skip the frame without decoding it, but check that this process was successful before continuing.
+                    assert video.grab() == True
+                    continue
+                # Read a frame from the video and check that this process was successful before continuing.
+                return_val, frame = video.read()
+                assert return_val == True
+                # Write frames to a directory named after the orginial video. Each video has the frame number
+                # as denoted by the frame index i.
+                jpg_path = os.path.join(new_frames_dir, f"{filename}_frame_{i}.jpg") if packed_writer is None else None
+                pending.append((i, executor.submit(_encode_frame, frame, jpg_path)))
+                if len(pending) > max_pending:
+                    _finish_oldest()
+            while len(pending) > 0:
+                _finish_oldest()
+        finally:
+            # Release current video.
+            video.release()
+    return len(frame_indices)
+
+
+def main(args):
+    with open(args.anno_json, 'r') as f:
+        eaf_files_dict = json.load(f)
+
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        for eaf_filename in eaf_files_dict.keys():
+            print(f"Processing eaf file: {eaf_filename}")
+            video_path = os.path.join(args.video_root, eaf_files_dict[eaf_filename]['relative_video_path'])
+            video = cv2.VideoCapture(video_path)
+            FPS = video.get(cv2.CAP_PROP_FPS)
+            num_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+            video.release()
+
+            # Get video path without file extension
+            file_path_wo_file_ex =  eaf_files_dict[eaf_filename]['relative_video_path'].split('.')[0]
+            # Separate path and rejoin in case someone is on Windows
+            file_path_wo_file_ex_split = os.path.split(file_path_wo_file_ex)
+            # Get the directory the video is in and the video filename separately (we'll use these later)
+            file_dir, filename = file_path_wo_file_ex_split[0], file_path_wo_file_ex_split[1]
+            # New directory for frames of video.
+            new_frames_dir = os.sep.join([args.clean_dir, file_dir, filename ])
+            if not os.path.exists(new_frames_dir): os.makedirs(new_frames_dir)
+            # The labels are written after the frames, so if they exist, this video was processed completely.
+            labels_path = os.path.join(new_frames_dir, filename+"_labels"+extension(args.label_format))
+            if args.skip_existing and os.path.isfile(labels_path):
+                print(f"\tSkipping file, its labels already exist: {labels_path}")
+                continue
+            # Obtain the annotation information for this specific EAF file.
+            eaf_file_dict = eaf_files_dict[eaf_filename]
+            # Convert the annotations of every tier to intervals of frames, with the labels of the annotations.
+            # A label is given to the frames from and including the start time in the annotation up to and including the
+            # end time (see frame_labels.py).
+            frame_labels = FrameLabels.from_annotations(eaf_file_dict["annotations"], FPS, num_frames)
+
+            # Write all frames, or only the frames that have a label in at least one tier.
+            write_mask = frame_labels.annotated() if args.annotated_only else np.ones(num_frames, dtype=bool)
+            print(f"\tWriting frames from file: {video_path}")
+            frames_written = _write_video_frames(video_path, new_frames_dir, filename, write_mask, args.frame_format,
+                                                 executor, 2 * args.threads)
+            print(f"\tWrote {frames_written} of {num_frames} frames.")
+
+            # Write these annotations out after adding labels for all tiers: either a CSV with the label of every frame
+            # for every tier, or a compact NPZ file with the intervals.
+            if args.label_format == 'csv':
+                frame_labels.save_csv(labels_path)
+            else:
+                frame_labels.save(labels_path)
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -11,69 +160,18 @@ if __name__ == '__main__':
     parser.add_argument('--video_root', type=str, help='Root dir of the SoI corpus video files.')
     parser.add_argument('--anno_json', type=str, help='Output .json file from parse_elan.py.')
     parser.add_argument('--clean_dir', type=str, help='Output directory for cleaned data.')
+    parser.add_argument('--label_format', type=str, choices=LABEL_FORMATS, default='csv',
+                        help='Format of the frame labels: a CSV file with the label of every frame, or a compact NPZ '
+                             'file with the frame intervals of the annotations (see frame_labels.py).')
+    parser.add_argument('--frame_format', type=str, choices=FRAME_FORMATS, default='jpg',
+                        help='Write a JPEG file per frame, or pack the JPEG-encoded frames of every video into a single '
+                             'file with an index (see packed_frames.py).')
+    parser.add_argument('--threads', type=int, default=1, help='Number of threads for encoding the frames.')
+    parser.add_argument('--annotated_only', action='store_true',
+                        help='Only write the frames that have a label in at least one annotation tier.')
+    parser.add_argument('--skip_existing', action='store_true',
+                        help='Skip the videos of which the labels were already written by a previous run.')
 
     args = parser.parse_args()
 
-with open(args.anno_json, 'r') as f:
-    eaf_files_dict = json.load(f)
-    
-for eaf_filename in eaf_files_dict.keys():
-    print(f"Processing eaf file: {eaf_filename}")
-    video_path = os.path.join(args.video_root, eaf_files_dict[eaf_filename]['relative_video_path'])
-    video = cv2.VideoCapture(video_path)
-    FPS = video.get(cv2.CAP_PROP_FPS)
-    num_frames = video.get(cv2.CAP_PROP_FRAME_COUNT)   
-
-    # Get video path without file extension
-    file_path_wo_file_ex =  eaf_files_dict[eaf_filename]['relative_video_path'].split('.')[0]
-    # Separate path and rejoin in case someone is on Windows
-    file_path_wo_file_ex_split = os.path.split(file_path_wo_file_ex)
-    # Get the directory the video is in and the video filename separately (we'll use these later)
-    file_dir, filename = file_path_wo_file_ex_split[0], file_path_wo_file_ex_split[1]
-    # New directory for frames of video. 
-    new_frames_dir = os.sep.join([args.clean_dir, file_dir, filename ])
-    if not os.path.exists(new_frames_dir): os.makedirs(new_frames_dir)
-    frame_count = 0
-    # Obtain the annotation information for this specific EAF file. 
-    eaf_file_dict = eaf_files_dict[eaf_filename]
-    print(f"\tWriting frames from file: {video_path}")
-    for i in range(int(num_frames)):
-        # Read a frame from the video and check that this process was successful before continuing. 
-        return_val, frame = video.read()                                             
-        assert return_val == True
-        # Write frames to a directory named after the orginial video. Each video has the frame number 
-        # as denoted by the frame_count counter. 
-        cv2.imwrite(os.path.join(new_frames_dir,  "{filename}_frame_{frame_count}.jpg"), frame) 
-        frame_count+=1 
-    # Release current video. 
-    video.release()
-    # Create a dataframe for the label of each frame. 
-    label_dataframe = pd.DataFrame()
-    # Go through annotation tiers for video. 
-    for label_tier in eaf_file_dict["annotations"].keys():
-        # Create an empty array with an inital label value of 'Nan' for each frame in the video.
-        tier_annos_array = ["Nan" for _ in range(frame_count)]
-        # Get all annotations for this specific tier. 
-        tier_annos = eaf_file_dict["annotations"][label_tier]
-        for anno in tier_annos:
-            # Annotations are formatted as "[start_time, end_time, label]"
-            start_time = anno[0]
-            # Start_time is in ms, so we first divide by 1000 to get the second value. Then we multiply by 
-            # the Frames per second to find out what frame index this second value is at. 
-            start_time_frame_i = int((start_time/1000)*FPS)
-            end_time = anno[1]
-            end_time_frame_i = int((end_time/1000)*FPS)
-            label = anno[2:]  
-            label = '\t'.join(label)
-                
-            # This will give this label to frames from and including the start time up until
-            # up to and including the end time (This might be something that needs to change).
-            # reference: https://stackoverflow.com/questions/11395057/python-set-list-range-to-a-specific-value
-            tier_annos_array[start_time_frame_i:(end_time_frame_i+1)] = [label]*((end_time_frame_i+1) - start_time_frame_i) 
-            # Check that the number of video frames is equal to the number of labels in this tier's array. 
-            assert len(tier_annos_array) == frame_count
-        # Create a column with the name of the current tier and add the array of label values to this column. 
-        label_dataframe[label_tier] =  tier_annos_array
-    # Write these anootations out to a CSV after adding labels for all tiers. 
-    label_dataframe.to_csv(os.path.join(new_frames_dir, filename+"_labels.csv"), index=False)
-    
+    main(args)
@@ -1,77 +1,75 @@
 import argparse
 import csv
-import dataclasses
 import os
-import re
-from collections import Counter
 
+import numpy as np
+
+from eaf_cache import EafCache
 from elan_parser import find_eaf_files, LSEEaf
+from gloss_normalization import GlossNormalizer, LSE_RULES
+from sample_filters import DurationBounds, FilterPipeline, MinCount
+from sample_table import SampleTable
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
 
     parser.add_argument('eaf_root', type=str, help='Root directory of the VGT corpus .eaf files.')
     parser.add_argument('video_root', type=str, help='Root directory of the VGT corpus video files.')
-    parser.add_argument('out_csv', type=str, help='Output CSV file.')
+    parser.add_argument('out_csv', type=str, help='Output CSV file (or Parquet file, if the name ends with .parquet).')
     parser.add_argument('glosses_csv', type=str, help='Output CSV file for gloss counter')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of parallel worker processes for parsing ELAN files.')
+    parser.add_argument('--eaf_cache', type=str,
+                        help='JSON file in which the parsed ELAN files are cached, so that only changed files are parsed '
+                             'when this script is run again.')
+    parser.add_argument('--eaf_backend', type=str, choices=['pympi', 'stream'], default='pympi',
+                        help='Parse the ELAN files with pympi, or with a streaming reader that only reads the tiers '
+                             'from which samples are collected (faster and using less memory).')
+    parser.add_argument('--min_duration_ms', type=int,
+                        help='Remove the samples with an annotation shorter than this number of milliseconds.')
+    parser.add_argument('--max_duration_ms', type=int,
+                        help='Remove the samples with an annotation longer than this number of milliseconds.')
 
     args = parser.parse_args()
 
     # 1. Collect EAF files.
     eaf_filepaths = find_eaf_files(args.eaf_root)
-    eaf_files = [LSEEaf(fp, args.video_root) for fp in eaf_filepaths]
+    tiers = LSEEaf.TIERS if args.eaf_backend == 'stream' else None
+    parsed_eafs = EafCache(args.eaf_cache).load(eaf_filepaths, args.jobs, tiers)
+    eaf_files = [LSEEaf(fp, args.video_root, eaf) for fp, eaf in zip(eaf_filepaths, parsed_eafs)]
 
     # 2. Collect gloss annotations from all files.
     id = 0
-    samples = []
+    samples = SampleTable()
     for eaf_file in eaf_files:
         annots = eaf_file.collect_islr_samples(id)
         if len(annots) > 0:
             id = annots[-1].id + 1
-            samples.extend(annots)
+            samples.append(annots)
 
 
     # 3. Pre-process the glosses in the samples.
-    def _to_upper(match_obj):
-        char_elem = match_obj.group(0)
-        return char_elem.upper()
-
-    unique_glosses = len(set([s.gloss.gloss for s in samples]))
+    normalize_gloss = GlossNormalizer(LSE_RULES)
+    samples['Gloss'] = np.array([normalize_gloss(gloss) for gloss in samples['Gloss']], dtype=object)
+    print(normalize_gloss.report())
+    unique_glosses = len(set(samples['Gloss']))
     print(f'After pre-processing the glosses, there are {unique_glosses} unique glosses in {len(samples)} samples.')
 
 
-    # 4. Count the number of occurrences of each gloss.
-    gloss_counter = Counter([s.gloss.gloss for s in samples])
-
+    # 4. Filter the samples, and count the number of occurrences of each gloss.
     # Keep only those samples which have a gloss that occurs at least 5 times.
     # At the time of writing this comment, this resulted in 2,535 samples.
-    unique_glosses = len(set([s.gloss.gloss for s in samples]))
-    print(f'Before reducing the samples, there are {unique_glosses} unique glosses in {len(samples)} samples.')
-    samples = list(filter(lambda s: s.gloss.gloss in [e[0] for e in gloss_counter.items() if e[1] >= 5], samples))
-    unique_glosses = len(set([s.gloss.gloss for s in samples]))
-    print(f'After reducing the samples, there are {unique_glosses} unique glosses in {len(samples)} samples.')
+    min_count = MinCount(5)
+    samples = FilterPipeline([DurationBounds(args.min_duration_ms, args.max_duration_ms), min_count]).apply(samples)
+    gloss_counter = min_count.counter
+    unique_glosses = len(set(samples['Gloss']))
 
     # 5. Reduce the EAF path to a relative path.
-    for sample in samples:
-        sample.metadata.filename = os.path.join(*sample.metadata.filename.split(os.sep)[-2:])
+    samples['EAF'] = np.array([os.path.join(*filename.split(os.sep)[-2:]) for filename in samples['EAF']],
+                              dtype=object)
 
 
     # 6. Save CSV files.
-    # Flatten tuples.
-    def _flatten(data):
-        if isinstance(data, tuple):
-            for x in data:
-                yield from _flatten(x)
-        else:
-            yield data
-
-
-    with open(args.out_csv, 'w') as of:
-        writer = csv.writer(of)
-        writer.writerow(
-            ['Id', 'Gloss', 'start_ms', 'end_ms', 'EAF', 'Participant', 'SourceVideo', 'SampleVideo'])
-        for sample in samples:
-            writer.writerow(list(_flatten(dataclasses.astuple(sample))))
+    samples.save(args.out_csv)
 
     with open(args.glosses_csv, 'w') as of:
         writer = csv.writer(of)
@@ -0,0 +1,115 @@
+"""Parse ELAN files in parallel, and cache the parsed tier data on disk, so that unchanged files are not parsed again."""
+import json
+import os
+
+from pympi import Eaf
+
+from clip_scheduler import run_jobs
+from eaf_reader import read_eaf
+
+
+class ParsedEaf:
+    """Contains the data of an ELAN file that is used to collect samples: the media descriptors, and the parameters and
+    annotations of every tier. It provides the same interface for this data as `pympi.Eaf`, but unlike `pympi.Eaf`,
+    it can be stored in a JSON file and sent to other processes."""
+
+    def __init__(self, media_descriptors: [dict], tier_parameters: {str: dict}, tier_annotations: {str: [tuple]}):
+        self.media_descriptors = media_descriptors
+        self._tier_parameters = tier_parameters
+        self._tier_annotations = tier_annotations
+
+    @classmethod
+    def from_eaf(cls, eaf: Eaf) -> 'ParsedEaf':
+        """Extract the data of all tiers from a parsed ELAN file."""
+        tier_annotations = dict()
+        for tier in eaf.tiers:
+            try:
+                tier_annotations[tier] = eaf.get_annotation_data_for_tier(tier)
+            except KeyError:  # Reference annotation without a parent: the tier is treated as missing, like in pympi.
+                pass
+        return cls(eaf.media_descriptors, {tier: eaf.get_parameters_for_tier(tier) for tier in eaf.tiers},
+                   tier_annotations)
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'ParsedEaf':
+        return cls(data['media_descriptors'], data['tier_parameters'],
+                   {tier: [tuple(a) for a in annotations] for tier, annotations in data['tier_annotations'].items()})
+
+    def to_json(self) -> dict:
+        return {'media_descriptors': self.media_descriptors, 'tier_parameters': self._tier_parameters,
+                'tier_annotations': self._tier_annotations}
+
+    def get_parameters_for_tier(self, tier: str) -> dict:
+        """See `pympi.Eaf.get_parameters_for_tier`.
+
+        :raises KeyError: If the tier does not exist."""
+        return self._tier_parameters[tier]
+
+    def get_annotation_data_for_tier(self, tier: str) -> [tuple]:
+        """See `pympi.Eaf.get_annotation_data_for_tier`.
+
+        :raises KeyError: If the tier does not exist."""
+        return self._tier_annotations[tier]
+
+
+def parse_eaf(eaf_path: str, tiers: [str] = None) -> ParsedEaf:
+    """Parse an ELAN file.
+
+    :param eaf_path: Path to the .eaf file.
+    :param tiers: If None, the file is parsed with pympi, and the annotations of all tiers are kept. Otherwise, only
+        the annotations of these tiers are read with the streaming reader of `eaf_reader`.
+    :raises ValueError: If the file could not be parsed."""
+    if tiers is not None:
+        return ParsedEaf(*read_eaf(eaf_path, tiers))
+    try:
+        return ParsedEaf.from_eaf(Eaf(eaf_path))
+    except Exception as e:
+        raise ValueError(f'Unable to parse eaf file {eaf_path}: {e}')
+
+
+class EafCache:
+    """On-disk cache of parsed ELAN files, keyed by their path.
+    Cached entries are invalidated when the size or the modification time of the ELAN file changes."""
+
+    def __init__(self, cache_path: str = None):
+        """Create a new EafCache instance.
+
+        :param cache_path: Path to the JSON cache file. If None, the parsed files are not cached."""
+        self._cache_path = cache_path
+        self._entries = dict()
+        if cache_path is not None and os.path.isfile(cache_path):
+            with open(cache_path) as cache_file:
+                self._entries = json.load(cache_file)
+
+    def load(self, eaf_paths: [str], num_workers: int = 1, tiers: [str] = None) -> [ParsedEaf]:
+        """Get the parsed data of the given ELAN files. Files that are not in the cache (or that have changed) are parsed
+        with `num_workers` parallel processes, after which the cache is updated.
+
+        :param eaf_paths: Paths to the ELAN files.
+        :param num_workers: The number of worker processes.
+        :param tiers: The tiers of which the annotations are needed, or None for all tiers (see `parse_eaf`).
+            Cached entries that were parsed for other tiers are parsed again.
+        :return: The parsed files, in the same order as `eaf_paths`.
+        :raises ValueError: If a file could not be parsed."""
+        eaf_paths = [str(p) for p in eaf_paths]
+        tiers = sorted(tiers) if tiers is not None else None
+        missing = [p for p in dict.fromkeys(eaf_paths) if not self._is_cached(p, tiers)]
+        parsed = run_jobs(parse_eaf, [(p, tiers) for p in missing], missing, num_workers)
+        for eaf_path, parsed_eaf in zip(missing, parsed):
+            stat = os.stat(eaf_path)
+            self._entries[eaf_path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'tiers': tiers,
+                                       'eaf': parsed_eaf.to_json()}
+        if self._cache_path is not None and len(missing) > 0:
+            with open(self._cache_path, 'w') as cache_file:
+                json.dump(self._entries, cache_file)
+        print(f'Parsed {len(missing)} ELAN files, loaded {len(set(eaf_paths)) - len(missing)} from the cache.')
+
+        parsed_eafs = dict(zip(missing, parsed))
+        return [parsed_eafs[p] if p in parsed_eafs else ParsedEaf.from_json(self._entries[p]['eaf']) for p in eaf_paths]
+
+    def _is_cached(self, eaf_path: str, tiers: [str]) -> bool:
+        entry = self._entries.get(eaf_path)
+        if entry is None or not os.path.isfile(eaf_path) or entry.get('tiers') != tiers:
+            return False
+        stat = os.stat(eaf_path)
+        return entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
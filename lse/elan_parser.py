@@ -5,6 +5,8 @@ from pathlib import Path
 import numpy as np
 from pympi import Eaf
 
+from eaf_cache import ParsedEaf
+
 
 def find_eaf_files(root_dir: str) -> [str]:
     """Collect all ELAN files for the VGT corpus.
@@ -57,16 +59,22 @@ class ISLRSample:
 class LSEEaf:
     """Contains all the relevant information for the LSE corpus present in .eaf files."""
 
-    def __init__(self, eaf_path: str, video_root: str):
+    # The tiers from which samples are collected.
+    TIERS = ['Glossa mà activa S1']
+
+    def __init__(self, eaf_path: str, video_root: str, eaf: ParsedEaf = None):
         """Create a new LSEEaf instance.
 
         :param eaf_path: The path to the .eaf file.
-        :param video_root: The path to where the videos are located on the machine on which this script is run."""
+        :param video_root: The path to where the videos are located on the machine on which this script is run.
+        :param eaf: The parsed .eaf file (see `eaf_cache.EafCache`). If None, the file is parsed here."""
         self._eaf_path = eaf_path
-        try:
-            self._eaf = Eaf(str(self._eaf_path))
-        except Exception as e:
-            raise ValueError(f'Unable to parse eaf file {self._eaf_path}: {e}')
+        self._eaf = eaf
+        if self._eaf is None:
+            try:
+                self._eaf = Eaf(str(self._eaf_path))
+            except Exception as e:
+                raise ValueError(f'Unable to parse eaf file {self._eaf_path}: {e}')
         self._video_root = video_root
 
     def collect_islr_samples(self, start_ID: int) -> [ISLRSample]:
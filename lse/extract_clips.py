@@ -4,6 +4,8 @@ import csv
 import os
 import subprocess
 
+from clip_scheduler import run_jobs
+
 
 def main(args):
     # Create gloss label encoding from gloss file.
@@ -16,6 +18,7 @@ def main(args):
             gloss_to_index[row[0]] = i
 
     output_samples = []
+    jobs, groups = [], []
     with open(args.dataset_csv) as dataset_file:
         reader = csv.reader(dataset_file)
         # Id,Gloss,start_ms,end_ms,Participant,SourceVideo,SampleVideo,subset
@@ -26,8 +29,14 @@ def main(args):
             gloss_encoding = gloss_to_index[gloss]
             output_samples.append([sample_id, gloss_encoding, participant, output_video, subset])
 
-            extract_subclip(os.path.join(args.video_dir, source_video), start_ms, end_ms,
-                            os.path.join(args.out_dir, output_video))
+            source_path = os.path.join(args.video_dir, source_video)
+            jobs.append((source_path, start_ms, end_ms, os.path.join(args.out_dir, output_video)))
+            groups.append(source_path)
+
+    exit_codes = run_jobs(extract_subclip, jobs, groups, args.jobs)
+    failed_jobs = sum(1 for exit_code in exit_codes if exit_code != 0)
+    if failed_jobs > 0:
+        print(f'{failed_jobs} of {len(exit_codes)} ffmpeg jobs failed.')
 
     with open(args.out_csv, 'w') as output_csv_file:
         writer = csv.writer(output_csv_file)
@@ -36,12 +45,12 @@ def main(args):
             writer.writerow(sample)
 
 
-def extract_subclip(source_video: str, start_ms: int, end_ms: int, output_video: str):
+def extract_subclip(source_video: str, start_ms: int, end_ms: int, output_video: str) -> int:
     """Extract a subclip from `start_ms` to `end_ms` from `source_video`, and write it to `output_video`."""
     if os.path.isfile(output_video):
-        return
-    subprocess.run(["ffmpeg", "-i", source_video.replace('MP4', 'mp4'), "-ss", f"{start_ms}ms", "-to", f"{end_ms}ms", "-filter:v", "fps=25",
-                    output_video])
+        return 0
+    return subprocess.run(["ffmpeg", "-i", source_video.replace('MP4', 'mp4'), "-ss", f"{start_ms}ms", "-to", f"{end_ms}ms", "-filter:v", "fps=25",
+                           output_video]).returncode
 
 
 if __name__ == '__main__':
@@ -52,6 +61,8 @@ if __name__ == '__main__':
     parser.add_argument('video_dir', type=str, help='Root video directory.')
     parser.add_argument('out_dir', type=str, help='Output directory for videos.')
     parser.add_argument('out_csv', type=str, help='CSV output containing dataset information ready for ML training.')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of parallel worker processes. Clips of the same source video share a worker.')
 
     args = parser.parse_args()
 
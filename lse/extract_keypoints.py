@@ -0,0 +1,184 @@
+"""Extract pose keypoints for every sample directly from the source videos, without writing intermediate clips.
+
+This is an alternative to running extract_clips.py followed by pose_estimation.py, for when only the keypoints are
+needed. Every source video is decoded once, and the frames within the time span of every sample are passed to
+MediaPipe Holistic directly. As in the clips, the frames are resampled to 25 frames per second."""
+import argparse
+import csv
+import os
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from clip_scheduler import run_jobs
+from keypoint_io import OUTPUT_FORMATS, extension, save_keypoints
+from pose_estimation import KeypointBuffer, create_holistic, prepare_frame
+
+CLIP_FPS = 25  # Frame rate of the clips written by extract_clips.py.
+
+
+def main(args):
+    samples_per_source = defaultdict(list)
+    with open(args.dataset_csv) as dataset_file:
+        reader = csv.reader(dataset_file)
+        # Id,Gloss,start_ms,end_ms,Participant,SourceVideo,SampleVideo,subset
+        _header = next(reader)
+        for row in reader:
+            sample_id, gloss, start_ms, end_ms, participant, source_video, output_video, subset = row
+
+            # Same file name as pose_estimation.py would write for the clip of this sample.
+            output_path = os.path.join(args.out_dir, output_video.replace('.mp4', extension(args.output_format)))
+            if not os.path.isfile(output_path):
+                source_path = os.path.join(args.video_dir, source_video).replace('MP4', 'mp4')
+                samples_per_source[source_path].append((int(start_ms), int(end_ms), output_path))
+
+    source_videos = list(samples_per_source.keys())
+    jobs = [(source_video, samples_per_source[source_video], args.output_format, args.equalize_histogram)
+            for source_video in source_videos]
+    written = run_jobs(extract_source_keypoints, jobs, source_videos, args.jobs)
+    print(f'Extracted keypoints for {sum(written)} samples from {len(source_videos)} source videos.')
+
+
+def extract_source_keypoints(source_video: str, samples: [(int, int, str)], output_format: str = 'npy',
+                             equalize_histogram: bool = False) -> int:
+    """Decode `source_video` once and extract the keypoints of all given samples, writing one NumPy array per sample.
+    The arrays have the same layout as those of `pose_estimation.run_mediapipe`.
+
+    Output frame k of a sample corresponds to the time `start_ms + k * 40` and is taken from the last source frame
+    that starts at or before that time (like ffmpeg's fps filter), until `end_ms` is reached.
+    Frames that do not belong to any sample are decoded but not converted or processed.
+
+    :param source_video: Path to the source video.
+    :param samples: Tuples of (start_ms, end_ms, output_path).
+    :param output_format: Format of the keypoint files (see keypoint_io.py).
+    :param equalize_histogram: Whether to perform histogram equalization before extracting MediaPipe keypoints.
+    :return: The number of samples for which keypoints were written."""
+    cap = cv2.VideoCapture(source_video)
+    if not cap.isOpened():
+        print(f'Could not open the source video with path `{source_video}`.')
+        return 0
+    fps = cap.get(cv2.CAP_PROP_FPS)
+
+    samples = sorted(samples)
+    holistic_pool = _HolisticPool()
+    active_clips = []
+    next_sample = 0
+    frame_index = 0
+    written = 0
+    while next_sample < len(samples) or len(active_clips) > 0:
+        if not cap.grab():  # Reached the end of the file.
+            break
+        frame_end_ms = 1000 * (frame_index + 1) / fps
+        frame_index += 1
+
+        while next_sample < len(samples) and samples[next_sample][0] < frame_end_ms:
+            clip = _SampleClip(*samples[next_sample])
+            next_sample += 1
+            if clip.finished:
+                # A sample without output frames (end_ms <= start_ms) is skipped, so that it does not keep the
+                # decoder running until the end of the source video.
+                print(f'Skipping sample `{clip.output_path}`: it has no frames (start_ms {clip.start_ms}, '
+                      f'end_ms {clip.end_ms}).')
+                continue
+            clip.holistic = holistic_pool.acquire()
+            active_clips.append(clip)
+        if not any(clip.pending_frames(frame_end_ms) > 0 for clip in active_clips):
+            continue
+
+        _success, frame = cap.retrieve()
+        frame = prepare_frame(frame, equalize_histogram)
+        for clip in active_clips:
+            clip.process(frame, frame_end_ms)
+
+        for clip in filter(lambda c: c.finished, active_clips):
+            save_keypoints(clip.output_path, clip.keypoints.to_array(), output_format)
+            holistic_pool.release(clip.holistic)
+            written += 1
+        active_clips = list(filter(lambda c: not c.finished, active_clips))
+    cap.release()
+
+    # Samples that extend beyond the end of the source video keep the frames that were available.
+    for clip in filter(lambda c: len(c.keypoints) > 0, active_clips):
+        save_keypoints(clip.output_path, clip.keypoints.to_array(), output_format)
+        written += 1
+    holistic_pool.close()
+
+    return written
+
+
+class _SampleClip:
+    """Collects the keypoints of a single sample while the source video is being decoded. The MediaPipe Holistic
+    instance can be assigned after creation, once it is known that the sample has frames (see `finished`)."""
+
+    def __init__(self, start_ms: int, end_ms: int, output_path: str, holistic=None):
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.output_path = output_path
+        self.holistic = holistic
+        self.keypoints = KeypointBuffer(int((end_ms - start_ms) * CLIP_FPS / 1000) + 1)
+
+    def pending_frames(self, until_ms: float) -> int:
+        """Get the number of output frames of this sample with a timestamp before `until_ms` that are not processed yet."""
+        count = 0
+        while self._frame_ms(len(self.keypoints) + count) < min(until_ms, self.end_ms):
+            count += 1
+        return count
+
+    def process(self, frame: np.ndarray, until_ms: float):
+        """Process `frame` for all pending output frames with a timestamp before `until_ms`.
+        The frame is processed several times if the source video has a lower frame rate than the clips."""
+        for _ in range(self.pending_frames(until_ms)):
+            self.keypoints.append(self.holistic.process(frame))
+
+    @property
+    def finished(self) -> bool:
+        return self._frame_ms(len(self.keypoints)) >= self.end_ms
+
+    def _frame_ms(self, output_frame_index: int) -> float:
+        return self.start_ms + 1000 * output_frame_index / CLIP_FPS
+
+
+class _HolisticPool:
+    """Reuses MediaPipe Holistic instances for consecutive samples, so that the graph is not built for every sample.
+    A new instance is only created when samples overlap in time. The tracking state is reset between samples."""
+
+    def __init__(self):
+        self._instances = []
+        self._available = []
+
+    def acquire(self):
+        if len(self._available) > 0:
+            holistic = self._available.pop()
+            holistic.reset()
+            return holistic
+        holistic = create_holistic()
+        self._instances.append(holistic)
+        return holistic
+
+    def release(self, holistic):
+        self._available.append(holistic)
+
+    def close(self):
+        for holistic in self._instances:
+            holistic.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('dataset_csv', type=str, help='CSV file containing sample information (from split_dataset.py).')
+    parser.add_argument('video_dir', type=str, help='Root video directory.')
+    parser.add_argument('out_dir', type=str, help='Output directory to which MediaPipe features will be saved.')
+    parser.add_argument('--equalize_histogram', action='store_true',
+                        help='Perform histogram equalization before extracting keypoints.')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of parallel worker processes (one source video per worker at a time).')
+
+    parser.add_argument('--output_format', type=str, choices=OUTPUT_FORMATS, default='npy',
+                        help='Format of the keypoint files: npy (float32), or the compact float16 or uint16 formats '
+                             '(NPZ files with a presence mask per body part, see keypoint_io.py).')
+
+    args = parser.parse_args()
+
+    main(args)
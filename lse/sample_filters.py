@@ -0,0 +1,104 @@
+"""Filter the collected samples with a chain of predicates.
+
+The predicates are evaluated over the columns of a `sample_table.SampleTable`, and every stage only considers the
+samples that were kept by the previous stages. Every stage takes linear time in the number of samples: predicates
+on glosses are evaluated once per distinct gloss, and gloss counts are looked up in a set."""
+from collections import Counter
+
+import numpy as np
+
+from sample_table import SampleTable
+
+
+class GlossPredicate:
+    """Keep the samples for which a predicate on the gloss holds."""
+
+    def __init__(self, name: str, predicate):
+        """Create a new GlossPredicate instance.
+
+        :param name: Name of the stage, for logging.
+        :param predicate: Function that takes a gloss and returns True if samples with this gloss should be kept."""
+        self.name = name
+        self._predicate = predicate
+
+    def __call__(self, table: SampleTable, keep: np.ndarray) -> np.ndarray:
+        keep_gloss = {gloss: self._predicate(gloss) for gloss in dict.fromkeys(table['Gloss'][keep])}
+        return np.fromiter((keep_gloss.get(gloss, False) for gloss in table['Gloss']), dtype=bool, count=len(table))
+
+
+class MinCount:
+    """Keep the samples with a gloss that occurs at least a given number of times in the kept samples."""
+
+    def __init__(self, min_count: int):
+        self.name = f'Minimum count ({min_count})'
+        self.min_count = min_count
+        # The gloss counts of the samples that were considered by this stage, in order of first occurrence.
+        self.counter = Counter()
+
+    def __call__(self, table: SampleTable, keep: np.ndarray) -> np.ndarray:
+        self.counter = Counter(table['Gloss'][keep])
+        frequent = {gloss for gloss, count in self.counter.items() if count >= self.min_count}
+        return np.fromiter((gloss in frequent for gloss in table['Gloss']), dtype=bool, count=len(table))
+
+
+class InsideVideo:
+    """Keep the samples of which the annotation starts and ends before the end of the source video."""
+
+    def __init__(self, durations_ms: {str: int}):
+        """Create a new InsideVideo instance.
+
+        :param durations_ms: The duration in milliseconds of every source video (the SourceVideo column)."""
+        self.name = 'Inside video'
+        self._durations_ms = durations_ms
+
+    def __call__(self, table: SampleTable, keep: np.ndarray) -> np.ndarray:
+        durations_ms = np.fromiter((self._durations_ms[video] for video in table['SourceVideo']), dtype=np.int64,
+                                   count=len(table))
+        return (table['start_ms'] < durations_ms) & (table['end_ms'] < durations_ms)
+
+
+class DurationBounds:
+    """Keep the samples of which the annotation duration (end_ms - start_ms) lies within the given bounds."""
+
+    def __init__(self, min_ms: int = None, max_ms: int = None):
+        """Create a new DurationBounds instance.
+
+        :param min_ms: The minimum duration in milliseconds (inclusive), or None for no minimum.
+        :param max_ms: The maximum duration in milliseconds (inclusive), or None for no maximum."""
+        bounds = ([f'at least {min_ms} ms'] if min_ms is not None else []) + \
+                 ([f'at most {max_ms} ms'] if max_ms is not None else [])
+        self.name = f'Duration bounds ({", ".join(bounds) if len(bounds) > 0 else "none"})'
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+
+    def __call__(self, table: SampleTable, keep: np.ndarray) -> np.ndarray:
+        durations_ms = table['end_ms'] - table['start_ms']
+        in_bounds = np.ones(len(table), dtype=bool)
+        if self.min_ms is not None:
+            in_bounds &= durations_ms >= self.min_ms
+        if self.max_ms is not None:
+            in_bounds &= durations_ms <= self.max_ms
+        return in_bounds
+
+
+class FilterPipeline:
+    """A chain of filter stages. A stage has a `name`, and is called with the `SampleTable` and the boolean mask of
+    the samples that are kept so far. It returns the boolean mask of the samples that it keeps."""
+
+    def __init__(self, stages: list):
+        self.stages = stages
+
+    def apply(self, table: SampleTable) -> SampleTable:
+        """Filter the samples, and log the number of samples that every stage removes.
+
+        :param table: The samples.
+        :return: A table with the kept samples, in their original order."""
+        glosses = table['Gloss']
+        keep = np.ones(len(table), dtype=bool)
+        print(f'Before filtering, there are {len(set(glosses))} unique glosses in {len(table)} samples.')
+        for stage in self.stages:
+            kept = np.count_nonzero(keep)
+            keep &= stage(table, keep)
+            print(f'{stage.name}: removed {kept - np.count_nonzero(keep)} samples, there are '
+                  f'{len(set(glosses[keep]))} unique glosses in {np.count_nonzero(keep)} samples.')
+        return table.filter(keep)
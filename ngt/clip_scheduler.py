@@ -0,0 +1,56 @@
+"""Run clip extraction jobs in parallel, using a pool of worker processes."""
+import math
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+def run_jobs(function, jobs: [tuple], groups: list, num_workers: int = 1, max_pending: int = None) -> list:
+    """Call `function(*job)` for every job in `jobs`, using a pool of `num_workers` worker processes.
+
+    Jobs that belong to the same group (e.g., clips from the same source video) are submitted one after the other,
+    to keep the disk access local. A group is split into consecutive chunks of at most
+    ceil(group size / `num_workers`) jobs, which are executed one after the other by a single worker. This way, a
+    dataset with many clips of only a few source videos still keeps all workers busy. At most `max_pending` chunks
+    are queued in the pool at any time, so that the job queue stays bounded for large datasets.
+
+    :param function: The function to call. It must be defined at module level, so that it can be pickled.
+    :param jobs: A list of argument tuples.
+    :param groups: For every job, the key of the group to which it belongs.
+    :param num_workers: The number of worker processes. With a single worker, the jobs are run in this process.
+    :param max_pending: The maximum number of queued chunks. Defaults to twice the number of workers.
+    :return: The return values of `function`, in the same order as `jobs`, even though jobs finish out of order."""
+    grouped_jobs = defaultdict(list)  # group -> [(index, job)], in order of first occurrence.
+    for index, (job, group) in enumerate(zip(jobs, groups)):
+        grouped_jobs[group].append((index, job))
+
+    results = [None] * len(jobs)
+    if num_workers <= 1:
+        for group_jobs in grouped_jobs.values():
+            _store_results(_run_group(function, group_jobs), results)
+        return results
+
+    if max_pending is None:
+        max_pending = 2 * num_workers
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        pending = set()
+        for group_jobs in grouped_jobs.values():
+            chunk_size = math.ceil(len(group_jobs) / num_workers)
+            for start in range(0, len(group_jobs), chunk_size):
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        _store_results(future.result(), results)
+                pending.add(executor.submit(_run_group, function, group_jobs[start:start + chunk_size]))
+        for future in pending:
+            _store_results(future.result(), results)
+    return results
+
+
+def _run_group(function, group_jobs: [(int, tuple)]) -> [(int, object)]:
+    """Run the jobs of a (chunk of a) group sequentially, keeping track of their original indices."""
+    return [(index, function(*job)) for index, job in group_jobs]
+
+
+def _store_results(indexed_results: [(int, object)], results: list):
+    for index, result in indexed_results:
+        results[index] = result
@@ -1,43 +1,60 @@
 import argparse
 import csv
-import dataclasses
 import os
-from collections import Counter
 
 import cv2
+import numpy as np
 
-from elan_parser import find_eaf_files, NGTEaf, ISLRSample
+from eaf_cache import EafCache
+from elan_parser import find_eaf_files, NGTEaf
+from gloss_normalization import GlossNormalizer, NGT_RULES
+from sample_filters import DurationBounds, FilterPipeline, GlossPredicate, InsideVideo, MinCount
+from sample_table import SampleTable
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
 
     parser.add_argument('eaf_root', type=str, help='Root directory of the NGT corpus .eaf files.')
     parser.add_argument('video_root', type=str, help='Root directory of the NGT corpus video files.')
-    parser.add_argument('out_csv', type=str, help='Output CSV file.')
+    parser.add_argument('out_csv', type=str, help='Output CSV file (or Parquet file, if the name ends with .parquet).')
     parser.add_argument('glosses_csv', type=str, help='Output CSV file for gloss counter')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of parallel worker processes for parsing ELAN files.')
+    parser.add_argument('--eaf_cache', type=str,
+                        help='JSON file in which the parsed ELAN files are cached, so that only changed files are parsed '
+                             'when this script is run again.')
+    parser.add_argument('--eaf_backend', type=str, choices=['pympi', 'stream'], default='pympi',
+                        help='Parse the ELAN files with pympi, or with a streaming reader that only reads the tiers '
+                             'from which samples are collected (faster and using less memory).')
+    parser.add_argument('--min_duration_ms', type=int,
+                        help='Remove the samples with an annotation shorter than this number of milliseconds.')
+    parser.add_argument('--max_duration_ms', type=int,
+                        help='Remove the samples with an annotation longer than this number of milliseconds.')
 
     args = parser.parse_args()
 
     # 1. Collect EAF files.
     eaf_filepaths = find_eaf_files(args.eaf_root)
-    eaf_files = list(filter(lambda f: f.is_valid(), [NGTEaf(fp, args.video_root) for fp in eaf_filepaths]))
+    tiers = NGTEaf.TIERS if args.eaf_backend == 'stream' else None
+    parsed_eafs = EafCache(args.eaf_cache).load(eaf_filepaths, args.jobs, tiers)
+    eaf_files = list(filter(lambda f: f.is_valid(),
+                            [NGTEaf(fp, args.video_root, eaf) for fp, eaf in zip(eaf_filepaths, parsed_eafs)]))
 
     # 2. Collect gloss annotations from all files.
     id = 0
-    samples = []
+    samples = SampleTable()
     for eaf_file in eaf_files:
         annots = eaf_file.collect_islr_samples('S1', id)
         if len(annots) > 0:
             id = annots[-1].id + 1
-            samples.extend(annots)
+            samples.append(annots)
         annots = eaf_file.collect_islr_samples('S2', id)
         if len(annots) > 0:
             id = annots[-1].id + 1
-            samples.extend(annots)
+            samples.append(annots)
 
 
     # For the NGT corpus, there are some annotations that are outside the effective video duration.
-    # We detect and remove those...
+    # We detect and remove those (see step 4).
     # We first extract the durations for every video, caching them, to avoid superfluous calculations.
 
     def _get_video_duration(filename):
@@ -49,22 +66,18 @@ if __name__ == '__main__':
 
 
     duration_cache = dict()
-    for sample in samples:
-        video_url = os.path.join(args.video_root, sample.videos.source_video.split('_')[0] + '.mpg')
+    source_video_durations = dict()
+    for source_video in dict.fromkeys(samples['SourceVideo']):
+        video_url = os.path.join(args.video_root, source_video.split('_')[0] + '.mpg')
         if video_url not in duration_cache:
             duration_cache[video_url] = _get_video_duration(video_url)
+        source_video_durations[source_video] = duration_cache[video_url]
 
 
-    def _annotation_time_valid(sample: ISLRSample) -> bool:
-        video_url = os.path.join(args.video_root, sample.videos.source_video.split('_')[0] + '.mpg')
-        start_ms = sample.gloss.start_ms
-        end_ms = sample.gloss.end_ms
-        duration_ms = duration_cache[video_url]
-        retval = start_ms < duration_ms and end_ms < duration_ms
-        return retval
-
-
-    samples = list(filter(_annotation_time_valid, samples))
+    # 3. Pre-process the glosses in the samples.
+    normalize_gloss = GlossNormalizer(NGT_RULES)
+    samples['Gloss'] = np.array([normalize_gloss(gloss) for gloss in samples['Gloss']], dtype=object)
+    print(normalize_gloss.report())
 
 
     def _gloss_filter(gloss):
@@ -76,44 +89,23 @@ if __name__ == '__main__':
         return not unwanted_gloss
 
 
-    unique_glosses = len(set([s.gloss.gloss for s in samples]))
-    print(f'Before filtering the glosses, there are {unique_glosses} unique glosses in {len(samples)} samples.')
-    samples = list(filter(lambda s: _gloss_filter(s.gloss.gloss), samples))
-    unique_glosses = len(set([s.gloss.gloss for s in samples]))
-    print(f'After filtering the glosses, there are {unique_glosses} unique glosses in {len(samples)} samples.')
-
-    # 4. Count the number of occurrences of each gloss.
-    gloss_counter = Counter([s.gloss.gloss for s in samples])
-
+    # 4. Filter the samples, and count the number of occurrences of each gloss.
     # Keep only those samples which have a gloss that occurs at least 20 times.
     # At the time of writing this comment, this resulted in 73980 samples.
-    unique_glosses = len(set([s.gloss.gloss for s in samples]))
-    print(f'Before reducing the samples, there are {unique_glosses} unique glosses in {len(samples)} samples.')
-    samples = list(filter(lambda s: s.gloss.gloss in [e[0] for e in gloss_counter.items() if e[1] >= 20], samples))
-    unique_glosses = len(set([s.gloss.gloss for s in samples]))
-    print(f'After reducing the samples, there are {unique_glosses} unique glosses in {len(samples)} samples.')
+    min_count = MinCount(20)
+    samples = FilterPipeline([InsideVideo(source_video_durations),
+                              DurationBounds(args.min_duration_ms, args.max_duration_ms),
+                              GlossPredicate('Gloss filter', _gloss_filter), min_count]).apply(samples)
+    gloss_counter = min_count.counter
+    unique_glosses = len(set(samples['Gloss']))
 
     # 5. Reduce the EAF path to a relative path.
-    for sample in samples:
-        sample.metadata.filename = os.path.join(*sample.metadata.filename.split(os.sep)[-2:])
+    samples['EAF'] = np.array([os.path.join(*filename.split(os.sep)[-2:]) for filename in samples['EAF']],
+                              dtype=object)
 
 
     # 6. Save CSV files.
-    # Flatten tuples.
-    def _flatten(data):
-        if isinstance(data, tuple):
-            for x in data:
-                yield from _flatten(x)
-        else:
-            yield data
-
-
-    with open(args.out_csv, 'w') as of:
-        writer = csv.writer(of)
-        writer.writerow(
-            ['Id', 'Gloss', 'start_ms', 'end_ms', 'EAF', 'Participant', 'Signer', 'Side', 'SourceVideo', 'SampleVideo'])
-        for sample in samples:
-            writer.writerow(list(_flatten(dataclasses.astuple(sample))))
+    samples.save(args.out_csv)
 
     with open(args.glosses_csv, 'w') as of:
         writer = csv.writer(of)
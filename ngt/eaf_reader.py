@@ -0,0 +1,80 @@
+"""Streaming reader for ELAN files, which only extracts the annotations of the tiers that are needed.
+
+Unlike `pympi.Eaf`, which builds the object model of all tiers, time slots and reference annotations, the XML file
+is read incrementally and only the time slots, the tier parameters and the annotations of the requested tiers are kept.
+The result is the same as that of the corresponding `pympi.Eaf` methods:
+    - Media descriptors: The attributes of every MEDIA_DESCRIPTOR element.
+    - Tier parameters: The attributes of every TIER element (for all tiers).
+    - Annotations: (start, end, value) tuples of the requested tiers, in document order. Missing time values are None,
+      and empty values are ''."""
+import xml.etree.ElementTree as ElementTree
+
+from pympi import Eaf
+
+
+def read_eaf(eaf_path: str, tiers: [str]) -> ([dict], {str: dict}, {str: [tuple]}):
+    """Read the media descriptors, the parameters of all tiers and the annotations of the given tiers of an ELAN file.
+
+    Tiers with reference annotations (i.e., annotations that depend on another tier) require the full object model.
+    If one of the requested tiers turns out to be such a tier, the file is parsed with pympi instead.
+
+    :param eaf_path: Path to the .eaf file.
+    :param tiers: Names of the tiers of which the annotations should be read. Missing tiers are ignored.
+    :return: The media descriptors, the tier parameters (by tier name) and the annotations (by tier name).
+    :raises ValueError: If the file could not be parsed."""
+    try:
+        return _read_eaf(str(eaf_path), set(tiers))
+    except _ReferenceTier:
+        eaf = Eaf(str(eaf_path))
+        return (eaf.media_descriptors, {tier: eaf.get_parameters_for_tier(tier) for tier in eaf.tiers},
+                {tier: eaf.get_annotation_data_for_tier(tier) for tier in tiers if tier in eaf.tiers})
+    except (ElementTree.ParseError, OSError, KeyError, ValueError) as e:
+        raise ValueError(f'Unable to parse eaf file {eaf_path}: {e}')
+
+
+class _ReferenceTier(Exception):
+    pass
+
+
+def _read_eaf(eaf_path: str, tiers: {str}) -> ([dict], {str: dict}, {str: [tuple]}):
+    media_descriptors = []
+    time_slots = dict()
+    tier_parameters = dict()
+    tier_annotations = dict()
+
+    tier_id = None
+    annotations = None  # Annotations of the current tier, if it is requested: {ID: (time slot 1, time slot 2, value)}.
+    for event, element in ElementTree.iterparse(eaf_path, events=('start', 'end')):
+        if event == 'start':
+            if element.tag == 'TIER':
+                tier_id = element.attrib['TIER_ID']
+                tier_parameters[tier_id] = dict(element.attrib)
+                annotations = dict() if tier_id in tiers else None
+            continue
+
+        if element.tag == 'ALIGNABLE_ANNOTATION':
+            if annotations is not None:
+                value = element[0].text if len(element) > 0 else None
+                annotations[element.attrib['ANNOTATION_ID']] = (element.attrib['TIME_SLOT_REF1'],
+                                                                element.attrib['TIME_SLOT_REF2'], value or '')
+        elif element.tag == 'REF_ANNOTATION':
+            if annotations is not None:
+                raise _ReferenceTier()
+        elif element.tag == 'ANNOTATION':
+            element.clear()  # Free the annotations of all tiers as soon as they have been read.
+        elif element.tag == 'TIER':
+            if annotations is not None:
+                if all(ts1 in time_slots and ts2 in time_slots for ts1, ts2, _value in annotations.values()):
+                    tier_annotations[tier_id] = [(time_slots[ts1], time_slots[ts2], value)
+                                                 for ts1, ts2, value in annotations.values()]
+                else:  # Like pympi, which raises a KeyError when the annotations are requested.
+                    tier_annotations.pop(tier_id, None)
+            annotations = None
+            element.clear()
+        elif element.tag == 'TIME_SLOT':
+            time_value = element.attrib.get('TIME_VALUE', None)
+            time_slots[element.attrib['TIME_SLOT_ID']] = None if time_value is None else int(time_value)
+        elif element.tag == 'MEDIA_DESCRIPTOR':
+            media_descriptors.append(dict(element.attrib))
+
+    return media_descriptors, tier_parameters, tier_annotations
@@ -4,6 +4,9 @@ import csv
 import os
 import subprocess
 
+from clip_scheduler import run_jobs
+from keyframes import KeyframeIndex
+
 
 def main(args):
     # Create gloss label encoding from gloss file.
@@ -16,6 +19,7 @@ def main(args):
             gloss_to_index[row[0]] = i
 
     output_samples = []
+    clips = []
     with open(args.dataset_csv) as dataset_file:
         reader = csv.reader(dataset_file)
         # Id,Gloss,start_ms,end_ms,Participant,SourceVideo,SampleVideo,subset
@@ -26,8 +30,25 @@ def main(args):
             gloss_encoding = gloss_to_index[gloss]
             output_samples.append([sample_id, gloss_encoding, participant, output_video, subset])
 
-            extract_subclip(os.path.join(args.video_dir, source_video), start_ms, end_ms, side,
-                            os.path.join(args.out_dir, output_video))
+            clips.append((os.path.join(args.video_dir, source_video), start_ms, end_ms, side,
+                          os.path.join(args.out_dir, output_video)))
+
+    keyframe_index = None
+    if args.keyframe_seek:
+        keyframe_index = KeyframeIndex(args.keyframe_cache)
+        keyframe_index.build([_source_mpg(clip[0]) for clip in clips], args.jobs)
+
+    jobs, groups = [], []
+    for source_path, start_ms, end_ms, side, output_path in clips:
+        source_mpg = _source_mpg(source_path)  # Both participants are cropped from the same video.
+        seek_ms = keyframe_index.seek_ms(source_mpg, start_ms) if keyframe_index is not None else 0
+        jobs.append((source_path, start_ms, end_ms, side, output_path, seek_ms))
+        groups.append(source_mpg)
+
+    exit_codes = run_jobs(extract_subclip, jobs, groups, args.jobs)
+    failed_jobs = sum(1 for exit_code in exit_codes if exit_code != 0)
+    if failed_jobs > 0:
+        print(f'{failed_jobs} of {len(exit_codes)} ffmpeg jobs failed.')
 
     with open(args.out_csv, 'w') as output_csv_file:
         writer = csv.writer(output_csv_file)
@@ -36,18 +57,35 @@ def main(args):
             writer.writerow(sample)
 
 
-def extract_subclip(source_video: str, start_ms: int, end_ms: int, side: str, output_video: str):
+def extract_subclip(source_video: str, start_ms: int, end_ms: int, side: str, output_video: str,
+                    seek_ms: int = 0) -> int:
     """Extract a subclip from `start_ms` to `end_ms` from `source_video`, and write it to `output_video`.
-    We use the `side` argument to crop the video to the left or the right half."""
+    We use the `side` argument to crop the video to the left or the right half.
+    If `seek_ms` is given (the position of a keyframe at or before `start_ms`), `ffmpeg` seeks to it before decoding,
+    so only the part of the source video after it is decoded, and then trims the clip to the exact start and end."""
     if os.path.isfile(output_video):
-        return
+        return 0
     y = 0
     w = 352
     h = 288
     x = 0 if side == 'left' else w
-    subprocess.run(
-        ["ffmpeg", "-i", source_video.replace('_b', '')[:-9] + '.mpg', "-ss", f"{start_ms}ms", "-to", f"{end_ms}ms",
-         "-filter:v", f"fps=25, crop={w}:{h}:{x}:{y}", output_video])
+    return subprocess.run(
+        ["ffmpeg", *_input_seek(seek_ms), "-i", _source_mpg(source_video),
+         "-ss", f"{int(start_ms) - seek_ms}ms", "-to", f"{int(end_ms) - seek_ms}ms",
+         "-filter:v", f"fps=25, crop={w}:{h}:{x}:{y}", output_video]).returncode
+
+
+def _source_mpg(source_video: str) -> str:
+    """Get the path to the video that contains both participants, from the path to the video of a single participant."""
+    return source_video.replace('_b', '')[:-9] + '.mpg'
+
+
+def _input_seek(seek_ms: int) -> [str]:
+    """Get the `ffmpeg` input options to seek to `seek_ms`. With an input-side `-ss`, the timestamps of the decoded
+    input restart at 0 at `seek_ms`, so the output options `-ss` and `-to` have to be given relative to `seek_ms`."""
+    if seek_ms == 0:
+        return []
+    return ["-ss", f"{seek_ms}ms"]
 
 
 if __name__ == '__main__':
@@ -58,6 +96,12 @@ if __name__ == '__main__':
     parser.add_argument('video_dir', type=str, help='Root video directory.')
     parser.add_argument('out_dir', type=str, help='Output directory for videos.')
     parser.add_argument('out_csv', type=str, help='CSV output containing dataset information ready for ML training.')
+    parser.add_argument('--keyframe_seek', action='store_true',
+                        help='Seek to the keyframe before every clip instead of decoding the source from the start.')
+    parser.add_argument('--keyframe_cache', type=str, default=None,
+                        help='JSON file in which the keyframe index of the source videos is cached.')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of parallel worker processes. Clips of the same source video share a worker.')
 
     args = parser.parse_args()
 
@@ -0,0 +1,72 @@
+"""Normalize gloss annotations with an ordered table of regular expression rules.
+
+A rule table is a list of (pattern, replacement) tuples, which are applied in order with `re.sub`. The replacement
+can be a string or a function, as for `re.sub`. Every distinct gloss is only normalized once: corpora contain many
+annotations of the same glosses, so the results are memoized."""
+import re
+import time
+
+import pandas as pd
+
+
+# Rules for the NGT corpus (see the module documentation). The glosses are currently used as annotated,
+# so there are no rules yet.
+NGT_RULES = []
+
+
+class GlossNormalizer:
+    """Applies a rule table to glosses, memoizing the result for every distinct gloss.
+    It keeps track of the number of cache hits and misses and of the time spent normalizing."""
+
+    def __init__(self, rules: [tuple]):
+        """Create a new GlossNormalizer instance.
+
+        :param rules: The rule table, see the module documentation. Patterns are compiled once, here."""
+        self._rules = [(re.compile(pattern), replacement) for pattern, replacement in rules]
+        self._cache = dict()
+        self.hits = 0
+        self.misses = 0
+        self.seconds = 0.0
+
+    def __call__(self, gloss: str) -> str:
+        """Normalize a single gloss."""
+        start_time = time.perf_counter()
+        normalized = self._cache.get(gloss)
+        if normalized is None:
+            normalized = self._apply_rules(gloss)
+            self._cache[gloss] = normalized
+            self.misses += 1
+        else:
+            self.hits += 1
+        self.seconds += time.perf_counter() - start_time
+        return normalized
+
+    def normalize_series(self, glosses: pd.Series) -> pd.Series:
+        """Normalize a Series of glosses in bulk. The rules are applied to the distinct glosses that are not in the cache
+        yet with the vectorized `Series.str.replace`, after which all glosses are looked up in the cache.
+
+        :param glosses: The glosses (strings).
+        :return: The normalized glosses, with the same index as `glosses`."""
+        start_time = time.perf_counter()
+        distinct = pd.Series(glosses.unique(), dtype=object)
+        new = distinct[~distinct.isin(self._cache.keys())]
+        if len(new) > 0:
+            normalized = new
+            for pattern, replacement in self._rules:
+                normalized = normalized.str.replace(pattern, replacement, regex=True)
+            self._cache.update(zip(new, normalized))
+        self.misses += len(new)
+        self.hits += len(glosses) - len(new)
+        result = glosses.map(self._cache)
+        self.seconds += time.perf_counter() - start_time
+        return result
+
+    def report(self) -> str:
+        """Get a summary of the number of normalized glosses, the cache hits and the time spent."""
+        return (f'Normalized {self.hits + self.misses} glosses ({self.misses} distinct, {self.hits} cache hits) '
+                f'in {self.seconds:.3f} seconds.')
+
+    def _apply_rules(self, gloss: str) -> str:
+        for pattern, replacement in self._rules:
+            gloss = pattern.sub(replacement, gloss)
+        return gloss
@@ -0,0 +1,78 @@
+"""Keyframe index of the source videos, used to seek to the keyframe before a clip instead of decoding the full video."""
+import bisect
+import json
+import math
+import os
+import subprocess
+
+from clip_scheduler import run_jobs
+
+
+class KeyframeIndex:
+    """Contains the keyframe positions of a set of source videos, optionally cached in a JSON file.
+
+    The index of a video is built once with `ffprobe`, which only reads the packets of the video stream and does not
+    decode any frames. Cached entries are invalidated when the size or the modification time of the video changes."""
+
+    def __init__(self, cache_path: str = None):
+        """Create a new KeyframeIndex instance.
+
+        :param cache_path: Path to the JSON cache file. If None, the index is not persisted."""
+        self._cache_path = cache_path
+        self._entries = dict()
+        if cache_path is not None and os.path.isfile(cache_path):
+            with open(cache_path) as cache_file:
+                self._entries = json.load(cache_file)
+
+    def build(self, video_paths: [str], num_workers: int = 1):
+        """Probe the keyframes of all videos that are not in the index yet (or that have changed), and update the cache.
+
+        :param video_paths: Paths to the source videos.
+        :param num_workers: Number of parallel `ffprobe` processes."""
+        missing = sorted(set(p for p in video_paths if os.path.isfile(p) and not self._is_cached(p)))
+        keyframes = run_jobs(probe_keyframes, [(p,) for p in missing], missing, num_workers)
+        for video_path, video_keyframes in zip(missing, keyframes):
+            stat = os.stat(video_path)
+            self._entries[video_path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                         'keyframes': video_keyframes}
+        if self._cache_path is not None and len(missing) > 0:
+            with open(self._cache_path, 'w') as cache_file:
+                json.dump(self._entries, cache_file)
+
+    def seek_ms(self, video_path: str, start_ms: int) -> int:
+        """Get the position (in milliseconds) to seek to in `video_path` before extracting a clip that starts at
+        `start_ms`. This is the position of the last keyframe at or before `start_ms`, rounded up to the millisecond.
+        If the video is not in the index (see `build`), this is 0, i.e., the video is decoded from the start."""
+        entry = self._entries.get(video_path)
+        if entry is None:
+            return 0
+        keyframes = entry['keyframes']
+        index = bisect.bisect_right(keyframes, int(start_ms) / 1000) - 1
+        if index < 0:
+            return 0
+        return min(math.ceil(keyframes[index] * 1000), int(start_ms))
+
+    def _is_cached(self, video_path: str) -> bool:
+        entry = self._entries.get(video_path)
+        if entry is None or not os.path.isfile(video_path):
+            return False
+        stat = os.stat(video_path)
+        return entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+
+
+def probe_keyframes(video_path: str) -> [float]:
+    """Get the timestamps (in seconds, relative to the start of the video) of the keyframes of a video.
+
+    :param video_path: Path to the video.
+    :return: A sorted list of keyframe timestamps. Empty if the video could not be probed."""
+    res = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0",
+                          "-show_entries", "packet=pts_time,flags:format=start_time", "-of", "json", video_path],
+                         capture_output=True, text=True)
+    if res.returncode != 0:
+        return []
+    probe = json.loads(res.stdout)
+    # Seeking with ffmpeg is relative to the start time of the container.
+    start_time = float(probe.get('format', {}).get('start_time', 0))
+    keyframes = [float(packet['pts_time']) - start_time for packet in probe.get('packets', [])
+                 if 'K' in packet.get('flags', '') and packet.get('pts_time', 'N/A') != 'N/A']
+    return sorted(keyframes)
@@ -1,15 +1,30 @@
 import argparse
 import csv
 import random
-from collections import defaultdict
 
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import StratifiedGroupKFold
 from sklearn.preprocessing import LabelEncoder
 
+from sample_table import read_dataframe
 
-def stratified_grouped_split(df: pd.DataFrame) -> pd.DataFrame:
+
+SUBSETS = ['train', 'val', 'test']
+
+
+def stratified_grouped_split(df: pd.DataFrame, test_ratio: float = 0.1, val_ratio: float = 0.1111,
+                             seed: int = 1) -> pd.DataFrame:
+    """Split the samples into a training, validation and test set, stratified by gloss and grouped by participant.
+    The test set is split off first, after which the validation set is split off from the remaining samples.
+
+    :param df: The samples, with (at least) the columns Id, Gloss and Participant.
+    :param test_ratio: The fraction of the samples in the test set. The split is made with `int(1 / test_ratio)` folds.
+    :param val_ratio: The fraction of the remaining (non-test) samples in the validation set.
+        The default of 11.11% of 90% results in 10% of the total.
+    :param seed: The seed for the random number generators of `random` and NumPy. The split itself is deterministic.
+    :return: A copy of `df` with the additional columns group, label and subset (a categorical with the values in
+        `SUBSETS`). The training and validation samples come first, followed by the test samples."""
     dfc = df.copy()
 
     group_encoder = LabelEncoder()
@@ -18,68 +33,84 @@ def stratified_grouped_split(df: pd.DataFrame) -> pd.DataFrame:
     gloss_encoder = LabelEncoder()
     dfc['label'] = gloss_encoder.fit_transform(dfc.Gloss.values)
 
-    test_ratio = 0.1  # 10% of total.
-    val_ratio = 0.1111  # 11.11% of 90% -> 10% of total.
+    random.seed(seed)
+    np.random.seed(seed)
 
-    dfc['subset'] = '?'
-
-    random.seed(1)
-    np.random.seed(1)
-
-    cv = StratifiedGroupKFold(n_splits=int(1 / test_ratio))  # 10 splits -> 10% will be test.
+    cv = StratifiedGroupKFold(n_splits=int(1 / test_ratio))
     trainval_indices, test_indices = next(cv.split(dfc.Id.values, dfc.label.values, dfc.group.values))
-    for index in test_indices:
-        dfc.iloc[index, dfc.columns.get_loc('subset')] = 'test'
+    subsets = np.full(len(dfc), -1, dtype=np.int8)  # Indices into SUBSETS.
+    subsets[test_indices] = SUBSETS.index('test')
 
+    # Positions of the remaining samples, in their original order.
+    trainval_indices = np.flatnonzero(subsets == -1)
     cv = StratifiedGroupKFold(n_splits=int(1 / val_ratio))
-    dfc_trainval = dfc.loc[dfc.subset == '?'].copy()
-    train_indices, val_indices = next(
-        cv.split(dfc_trainval.Id.values, dfc_trainval.label.values, dfc_trainval.group.values))
-    for index in train_indices:
-        dfc_trainval.iloc[index, dfc_trainval.columns.get_loc('subset')] = 'train'
-    for index in val_indices:
-        dfc_trainval.iloc[index, dfc_trainval.columns.get_loc('subset')] = 'val'
+    train_indices, val_indices = next(cv.split(dfc.Id.values[trainval_indices], dfc.label.values[trainval_indices],
+                                               dfc.group.values[trainval_indices]))
+    subsets[trainval_indices[train_indices]] = SUBSETS.index('train')
+    subsets[trainval_indices[val_indices]] = SUBSETS.index('val')
 
-    dfc_test = dfc.loc[dfc.subset == 'test']
+    assert not np.any(subsets == -1)
 
-    dfc_complete = pd.concat([dfc_trainval, dfc_test])
+    dfc['subset'] = pd.Categorical.from_codes(subsets, categories=SUBSETS)
+    dfc_complete = dfc.iloc[np.concatenate([trainval_indices, np.flatnonzero(subsets == SUBSETS.index('test'))])]
 
     print(f'There are {len(dfc_complete.loc[dfc_complete.subset == "train"])} training samples,', end=' ')
     print(f'{len(dfc_complete.loc[dfc_complete.subset == "val"])} validation samples,', end=' ')
     print(f'and {len(dfc_complete.loc[dfc_complete.subset == "test"])} test samples.')
 
-    assert 0 == len(dfc_complete.loc[dfc_complete.subset == "?"])
-
     return dfc_complete
 
 
+def gloss_coverage(df: pd.DataFrame, subsets: list = SUBSETS, subset_column: str = 'subset') -> pd.DataFrame:
+    """Count the samples of every gloss in every subset (or fold), and mark the glosses that occur in all of them.
+
+    :param df: The samples, with the columns Gloss and `subset_column`.
+    :param subsets: The subsets in which every gloss should occur, e.g., the folds of a k-fold split.
+    :param subset_column: The column that contains the subset of every sample.
+    :return: A DataFrame with one row per gloss, one column with the number of samples per subset, and a boolean
+        column Kept."""
+    coverage = pd.crosstab(df.Gloss, df[subset_column].to_numpy()).reindex(columns=subsets, fill_value=0)
+    coverage.columns.name = None
+    coverage['Kept'] = (coverage[subsets] > 0).all(axis=1)
+    return coverage
+
+
+def filter_gloss_coverage(df: pd.DataFrame, subsets: list = SUBSETS,
+                          subset_column: str = 'subset') -> (pd.DataFrame, pd.DataFrame):
+    """Drop the samples of glosses that do not occur in all subsets (see `gloss_coverage`).
+
+    :return: The samples of the glosses that occur in all subsets, and the coverage of all glosses."""
+    coverage = gloss_coverage(df, subsets, subset_column)
+    return df[df.Gloss.isin(coverage.index[coverage.Kept])], coverage
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
 
-    parser.add_argument('csv_in', type=str, help='Input CSV file (output of create_dataset.py).')
+    parser.add_argument('csv_in', type=str, help='Input CSV or Parquet file (output of create_dataset.py).')
     parser.add_argument('csv_out', type=str, help='Output CSV file.')
     parser.add_argument('glosses_out', type=str, help='Glosses output file.')
+    parser.add_argument('--test_ratio', type=float, default=0.1, help='Fraction of the samples in the test set.')
+    parser.add_argument('--val_ratio', type=float, default=0.1111,
+                        help='Fraction of the remaining (non-test) samples in the validation set.')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed.')
+    parser.add_argument('--coverage_report', type=str,
+                        help='Output CSV file with the number of samples of every gloss in every subset.')
 
     args = parser.parse_args()
 
-    # 1. Read CSV into DataFrame.
-    df = pd.read_csv(args.csv_in)
+    # 1. Read CSV (or Parquet) into DataFrame.
+    df = read_dataframe(args.csv_in)
 
     # 2. Perform stratified grouped dataset split.
-    df = stratified_grouped_split(df)
+    df = stratified_grouped_split(df, args.test_ratio, args.val_ratio, args.seed)
 
     # 3. Drop glosses that are not present in train, val, and test.
-    glosses_datasets = defaultdict(list)  # gloss -> [datasets].
-    glosses = df.Gloss.unique().tolist()
-    for gloss in glosses:
-        rows_of_gloss = df.loc[df.Gloss == gloss]
-        for subset in ['train', 'val', 'test']:
-            occurs = (rows_of_gloss.subset == subset).any()
-            if occurs:
-                glosses_datasets[gloss].append(subset)
-    glosses_in_all_subsets = list(
-        map(lambda tup: tup[0], filter(lambda tup: len(tup[1]) == 3, glosses_datasets.items())))
-    df = df[df.Gloss.isin(glosses_in_all_subsets)]
+    df, coverage = filter_gloss_coverage(df)
+    print(f'Dropped {len(coverage) - coverage.Kept.sum()} of {len(coverage)} glosses, '
+          f'which do not occur in all subsets.')
+    if args.coverage_report is not None:
+        coverage.to_csv(args.coverage_report, index_label='Gloss')
 
     # 4. Write output.
     df = df.drop(columns=['EAF', 'Signer', 'group', 'label'])
@@ -3,6 +3,10 @@ import argparse
 import csv
 import os
 import subprocess
+from collections import defaultdict
+
+from clip_scheduler import run_jobs
+from keyframes import KeyframeIndex
 
 
 def main(args):
@@ -16,6 +20,7 @@ def main(args):
             gloss_to_index[row[0]] = i
 
     output_samples = []
+    clips = []
     with open(args.dataset_csv) as dataset_file:
         reader = csv.reader(dataset_file)
         # Id,Gloss,start_ms,end_ms,Participant,SourceVideo,SampleVideo,subset
@@ -26,8 +31,35 @@ def main(args):
             gloss_encoding = gloss_to_index[gloss]
             output_samples.append([sample_id, gloss_encoding, participant, output_video, subset])
 
-            extract_subclip(os.path.join(args.video_dir, source_video), start_ms, end_ms,
-                            os.path.join(args.out_dir, output_video))
+            clips.append((os.path.join(args.video_dir, source_video), start_ms, end_ms,
+                          os.path.join(args.out_dir, output_video)))
+
+    keyframe_index = None
+    if args.keyframe_seek:
+        keyframe_index = KeyframeIndex(args.keyframe_cache)
+        keyframe_index.build([clip[0] for clip in clips], args.jobs)
+
+    jobs, groups = [], []
+    clips_per_source = defaultdict(list)
+    for source_path, start_ms, end_ms, output_path in clips:
+        seek_ms = keyframe_index.seek_ms(source_path, start_ms) if keyframe_index is not None else 0
+        clip = (start_ms, end_ms, output_path, seek_ms)
+        if args.single_pass:
+            clips_per_source[source_path].append(clip)
+        else:
+            jobs.append((source_path, *clip))
+            groups.append(source_path)
+
+    if args.single_pass:
+        # Every source video is decoded once for all of its samples.
+        jobs = [(source_path, clips, args.max_outputs) for source_path, clips in clips_per_source.items()]
+        groups = list(clips_per_source.keys())
+        exit_codes = run_jobs(extract_subclips, jobs, groups, args.jobs)
+    else:
+        exit_codes = run_jobs(extract_subclip, jobs, groups, args.jobs)
+    failed_jobs = sum(1 for exit_code in exit_codes if exit_code != 0)
+    if failed_jobs > 0:
+        print(f'{failed_jobs} of {len(exit_codes)} ffmpeg jobs failed.')
 
     with open(args.out_csv, 'w') as output_csv_file:
         writer = csv.writer(output_csv_file)
@@ -36,12 +68,50 @@ def main(args):
             writer.writerow(sample)
 
 
-def extract_subclip(source_video: str, start_ms: int, end_ms: int, output_video: str):
-    """Extract a subclip from `start_ms` to `end_ms` from `source_video`, and write it to `output_video`."""
+def extract_subclip(source_video: str, start_ms: int, end_ms: int, output_video: str, seek_ms: int = 0) -> int:
+    """Extract a subclip from `start_ms` to `end_ms` from `source_video`, and write it to `output_video`.
+
+    :param seek_ms: Position of a keyframe at or before `start_ms`. `ffmpeg` seeks to this position before decoding,
+        so only the part of the source video after it is decoded, and then trims the clip to the exact start and end.
+    :return: The exit code of `ffmpeg` (0 if the subclip already exists)."""
     if os.path.isfile(output_video):
-        return
-    subprocess.run(["ffmpeg", "-i", source_video, "-ss", f"{start_ms}ms", "-to", f"{end_ms}ms", "-filter:v", "fps=25",
-                    output_video])
+        return 0
+    return subprocess.run(["ffmpeg", *_input_seek(seek_ms), "-i", source_video,
+                           "-ss", f"{int(start_ms) - seek_ms}ms", "-to", f"{int(end_ms) - seek_ms}ms",
+                           "-filter:v", "fps=25", output_video]).returncode
+
+
+def extract_subclips(source_video: str, clips: [(int, int, str, int)], max_outputs: int = 64) -> int:
+    """Extract several subclips from `source_video` with a single `ffmpeg` process per batch of clips.
+    Every output gets its own `-ss`/`-to` output options, so `ffmpeg` decodes the source video once per batch and
+    passes the decoded frames to all outputs, instead of decoding the source from the start for every sample.
+    The clips are sorted by start time, so that every batch only needs to read the source up to its last clip.
+
+    :param source_video: Path to the source video.
+    :param clips: Tuples of (start_ms, end_ms, output_video, seek_ms). Clips of which the output video exists are
+        skipped. Every batch seeks to the `seek_ms` of its first clip (see `extract_subclip`).
+    :param max_outputs: Maximum number of outputs per `ffmpeg` process. This bounds the number of simultaneously
+        open encoders (and hence the memory usage) for sessions with many samples.
+    :return: The first non-zero exit code of the `ffmpeg` processes, or 0 if all of them succeeded."""
+    clips = sorted(filter(lambda c: not os.path.isfile(c[2]), clips), key=lambda c: int(c[0]))
+    exit_code = 0
+    for batch_start in range(0, len(clips), max_outputs):
+        batch = clips[batch_start:batch_start + max_outputs]
+        seek_ms = batch[0][3]
+        command = ["ffmpeg", *_input_seek(seek_ms), "-i", source_video]
+        for start_ms, end_ms, output_video, _seek_ms in batch:
+            command += ["-ss", f"{int(start_ms) - seek_ms}ms", "-to", f"{int(end_ms) - seek_ms}ms",
+                        "-filter:v", "fps=25", output_video]
+        exit_code = exit_code or subprocess.run(command).returncode
+    return exit_code
+
+
+def _input_seek(seek_ms: int) -> [str]:
+    """Get the `ffmpeg` input options to seek to `seek_ms`. With an input-side `-ss`, the timestamps of the decoded
+    input restart at 0 at `seek_ms`, so the output options `-ss` and `-to` have to be given relative to `seek_ms`."""
+    if seek_ms == 0:
+        return []
+    return ["-ss", f"{seek_ms}ms"]
 
 
 if __name__ == '__main__':
@@ -52,6 +122,16 @@ if __name__ == '__main__':
     parser.add_argument('video_dir', type=str, help='Root video directory.')
     parser.add_argument('out_dir', type=str, help='Output directory for videos.')
     parser.add_argument('out_csv', type=str, help='CSV output containing dataset information ready for ML training.')
+    parser.add_argument('--single_pass', action='store_true',
+                        help='Decode every source video once and extract all of its clips from that single decode.')
+    parser.add_argument('--max_outputs', type=int, default=64,
+                        help='Maximum number of clips extracted by a single ffmpeg process in single pass mode.')
+    parser.add_argument('--keyframe_seek', action='store_true',
+                        help='Seek to the keyframe before every clip instead of decoding the source from the start.')
+    parser.add_argument('--keyframe_cache', type=str, default=None,
+                        help='JSON file in which the keyframe index of the source videos is cached.')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of parallel worker processes. Clips of the same source video share a worker.')
 
     args = parser.parse_args()
 
@@ -0,0 +1,82 @@
+"""Save and load pose keypoint arrays, optionally in a compact format.
+
+Keypoint arrays have the shape (L, K, 3) and contain NaN values for body parts that were not detected in a frame
+(see `pose_estimation.run_mediapipe`). Besides the plain NumPy format, two compact formats are supported, which are
+stored in an NPZ archive:
+    - float16: The coordinates are stored as float16.
+    - uint16: The coordinates are quantised to uint16, using an offset and a scale per axis (x, y, z) that are stored
+      along with them. The quantisation error is at most half the scale, i.e., 1/131070 of the range of the axis.
+Instead of NaN values, the compact formats contain a presence mask per frame and per body part, packed to bits."""
+import numpy as np
+
+OUTPUT_FORMATS = ('npy', 'float16', 'uint16')
+# Number of keypoints of every body part in the keypoint arrays of pose_estimation.py: pose, left hand, right hand.
+PART_SIZES = (33, 21, 21)
+
+_UINT16_MAX = np.iinfo(np.uint16).max
+
+
+def extension(output_format: str) -> str:
+    """Get the file extension (including the dot) of keypoint files in the given format."""
+    return '.npy' if output_format == 'npy' else '.npz'
+
+
+def save_keypoints(path: str, keypoints: np.ndarray, output_format: str = 'npy', part_sizes: (int,) = PART_SIZES):
+    """Save a keypoint array in the given format.
+
+    :param path: Output path. It should have the extension given by `extension`.
+    :param keypoints: Array of shape (L, K, 3), with NaN values for missing body parts.
+    :param output_format: One of `OUTPUT_FORMATS`.
+    :param part_sizes: The number of keypoints of every body part, in order. They should sum to K.
+    :raises ValueError: If the output format is not supported."""
+    if output_format == 'npy':
+        np.save(path, keypoints)
+        return
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f'Unsupported output format `{output_format}`, expected one of {OUTPUT_FORMATS}.')
+
+    part_offsets = np.cumsum((0,) + tuple(part_sizes))[:-1]
+    # A body part is either detected entirely or not at all, so the first keypoint of every part suffices.
+    presence = ~np.isnan(keypoints[:, part_offsets, 0])
+    fields = {'part_sizes': np.array(part_sizes, dtype=np.int32),
+              'num_frames': np.array(len(keypoints), dtype=np.int64),
+              'mask': np.packbits(presence, axis=0)}
+
+    coordinates = np.nan_to_num(keypoints, nan=0.0)
+    if output_format == 'float16':
+        fields['coordinates'] = coordinates.astype(np.float16)
+    else:
+        present = keypoints[~np.isnan(keypoints[..., 0])]  # (N, 3)
+        offset = present.min(axis=0) if len(present) > 0 else np.zeros(3)
+        value_range = present.max(axis=0) - offset if len(present) > 0 else np.zeros(3)
+        scale = np.where(value_range > 0, value_range / _UINT16_MAX, 1.0)
+        quantised = np.rint((coordinates - offset) / scale)
+        fields['coordinates'] = np.clip(quantised, 0, _UINT16_MAX).astype(np.uint16)
+        fields['offset'] = offset.astype(np.float64)
+        fields['scale'] = scale.astype(np.float64)
+
+    with open(path, 'wb') as output_file:
+        np.savez(output_file, **fields)
+
+
+def load_keypoints(path: str) -> np.ndarray:
+    """Load a keypoint array that was saved with `save_keypoints`, in any format.
+
+    :param path: Path to an NPY or NPZ keypoint file.
+    :return: A float32 array of shape (L, K, 3), with NaN values for missing body parts (for NPY files, the array is
+        returned as it was saved)."""
+    if path.endswith('.npy'):
+        return np.load(path)
+
+    with np.load(path) as archive:
+        coordinates = archive['coordinates']
+        if coordinates.dtype == np.uint16:
+            keypoints = (coordinates * archive['scale'] + archive['offset']).astype(np.float32)
+        else:
+            keypoints = coordinates.astype(np.float32)
+        presence = np.unpackbits(archive['mask'], axis=0, count=int(archive['num_frames'])).astype(bool)
+        part_sizes = archive['part_sizes']
+
+    # Expand the presence of every body part to its keypoints.
+    keypoints[~np.repeat(presence, part_sizes, axis=1)] = np.nan
+    return keypoints
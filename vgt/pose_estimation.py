@@ -7,12 +7,18 @@ import mediapipe as mp
 import numpy as np
 from skimage import exposure
 
+from keypoint_io import OUTPUT_FORMATS, extension, save_keypoints
+
 mp_holistic = mp.solutions.holistic
 
+NUM_KEYPOINTS = 75
+# Name of the MediaPipe Holistic result, offset in the keypoint array and number of keypoints of every body part.
+BODY_PARTS = (('pose_landmarks', 0, 33), ('left_hand_landmarks', 33, 21), ('right_hand_landmarks', 54, 21))
+
 
-def run_mediapipe(video_path: str, equalize_histogram: bool = False) -> np.ndarray:
+def run_mediapipe(video_path: str, equalize_histogram: bool = False, holistic: mp_holistic.Holistic = None) -> np.ndarray:
     """Perform human pose estimation using MediaPipe Holistic for a given video.
-    The video will be processed in its entirety, and a NumPy array will be returned containing the pose keypoints.
+    The video will be processed in its entirety, and a float32 NumPy array will be returned containing the pose keypoints.
 
     The shape of the NumPy array is (L, 75, 3), where L is the number of video frames,
     75 is the number of extracted keypoints, and 3 is the coordinate dimensionality (x, y, z).
@@ -25,61 +31,97 @@ def run_mediapipe(video_path: str, equalize_histogram: bool = False) -> np.ndarr
 
     :param video_path: Path to the video file.
     :param equalize_histogram: Whether to perform histogram equalization before extracting MediaPipe keypoints.
+    :param holistic: MediaPipe Holistic instance to use, e.g., to reuse a single instance for many videos.
+        Its tracking state should be reset between videos. If None, a new instance is created for this video.
     :returns: A NumPy array of shape (L, 75, 3) containing the keypoints.
     :raises FileNotFoundError: If the video file was not found."""
 
+    if holistic is None:
+        with create_holistic() as holistic:
+            return run_mediapipe(video_path, equalize_histogram, holistic)
+
     # Processing of the video.
-    with mp_holistic.Holistic(
-            static_image_mode=False,
-            model_complexity=2,
-            smooth_landmarks=True) as holistic:
-        frames = []
-
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise FileNotFoundError(
-                f'Could not open the video clip with path `{video_path}`. '
-                f'Please check whether you have provided the correct filename.')
-        while cap.isOpened():
-            success, frame = cap.read()
-            if not success:  # Reached the end of the file.
-                break
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            if equalize_histogram:
-                p2, p98 = np.percentile(frame, (2, 98))
-                frame = exposure.rescale_intensity(frame, in_range=(p2, p98))
-            frame_landmarks = holistic.process(frame)
-            frame_output = []
-
-            if frame_landmarks.pose_landmarks:
-                landmarks = np.stack([np.array([l.x, l.y, l.z]) for l in frame_landmarks.pose_landmarks.landmark])
-                frame_output.append(landmarks)
-            else:
-                frame_output.append(np.full((33, 3), np.nan))
-            if frame_landmarks.left_hand_landmarks:
-                landmarks = np.stack(
-                    [np.array([l.x, l.y, l.z]) for l in frame_landmarks.left_hand_landmarks.landmark])
-                frame_output.append(landmarks)
-            else:
-                frame_output.append(np.full((21, 3), np.nan))
-            if frame_landmarks.right_hand_landmarks:
-                landmarks = np.stack(
-                    [np.array([l.x, l.y, l.z]) for l in frame_landmarks.right_hand_landmarks.landmark])
-                frame_output.append(landmarks)
-            else:
-                frame_output.append(np.full((21, 3), np.nan))
-
-            frames.append(np.concatenate(frame_output, axis=0))
-        cap.release()
-
-        return np.stack(frames)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(
+            f'Could not open the video clip with path `{video_path}`. '
+            f'Please check whether you have provided the correct filename.')
+    frames = KeypointBuffer(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    while cap.isOpened():
+        success, frame = cap.read()
+        if not success:  # Reached the end of the file.
+            break
+        frame_landmarks = holistic.process(prepare_frame(frame, equalize_histogram))
+        frames.append(frame_landmarks)
+    cap.release()
+
+    return frames.to_array()
+
+
+def prepare_frame(frame: np.ndarray, equalize_histogram: bool = False) -> np.ndarray:
+    """Convert a BGR frame read with OpenCV to the RGB input of MediaPipe Holistic, optionally equalizing its histogram."""
+    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    if equalize_histogram:
+        p2, p98 = np.percentile(frame, (2, 98))
+        frame = exposure.rescale_intensity(frame, in_range=(p2, p98))
+    return frame
+
+
+def create_holistic() -> mp_holistic.Holistic:
+    """Create a MediaPipe Holistic instance with the settings used for this corpus."""
+    return mp_holistic.Holistic(
+        static_image_mode=False,
+        model_complexity=2,
+        smooth_landmarks=True)
+
+
+def write_keypoints(frame_landmarks, out: np.ndarray):
+    """Write the MediaPipe Holistic results for a single frame to `out`, an array of shape (75, 3).
+    The landmarks of every body part are written with a single slice assignment,
+    and missing body parts are set to `np.nan` (see `run_mediapipe`)."""
+    for attribute, offset, count in BODY_PARTS:
+        landmarks = getattr(frame_landmarks, attribute)
+        if landmarks:
+            out[offset:offset + count] = [(l.x, l.y, l.z) for l in landmarks.landmark]
+        else:
+            out[offset:offset + count] = np.nan
+
+
+class KeypointBuffer:
+    """Array of shape (L, 75, 3) to which the MediaPipe Holistic results of a video are written frame by frame.
+
+    The keypoints are written directly into a preallocated float32 array, whose capacity is doubled whenever it is full.
+    This avoids allocating small arrays for every frame, as well as stacking all frames into a second copy at the end."""
+
+    def __init__(self, capacity: int = 256):
+        """Create a new KeypointBuffer instance.
+
+        :param capacity: The initial number of frames, e.g., the frame count of the video if it is known."""
+        self._data = np.empty((max(capacity, 1), NUM_KEYPOINTS, 3), dtype=np.float32)
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, frame_landmarks):
+        """Append the MediaPipe Holistic results for a single frame."""
+        if self._length == len(self._data):
+            data = np.empty((2 * len(self._data), NUM_KEYPOINTS, 3), dtype=np.float32)
+            data[:self._length] = self._data[:self._length]
+            self._data = data
+        write_keypoints(frame_landmarks, self._data[self._length])
+        self._length += 1
+
+    def to_array(self) -> np.ndarray:
+        """Get the keypoints of all appended frames as an array of shape (L, 75, 3). This is a view, not a copy."""
+        return self._data[:self._length]
 
 
 def main(args):
-    output_path = os.path.join(args.out_dir, os.path.basename(args.clip).replace('.mp4', '.npy'))
+    output_path = os.path.join(args.out_dir, os.path.basename(args.clip).replace('.mp4', extension(args.output_format)))
     if not os.path.isfile(output_path):
         keypoints = run_mediapipe(args.clip, args.equalize_histogram)
-        np.save(output_path, keypoints)
+        save_keypoints(output_path, keypoints, args.output_format)
 
 
 if __name__ == '__main__':
@@ -91,6 +133,10 @@ if __name__ == '__main__':
     parser.add_argument('--equalize_histogram', action='store_true',
                         help='Perform histogram equalization before extracting keypoints.')
 
+    parser.add_argument('--output_format', type=str, choices=OUTPUT_FORMATS, default='npy',
+                        help='Format of the keypoint files: npy (float32), or the compact float16 or uint16 formats '
+                             '(NPZ files with a presence mask per body part, see keypoint_io.py).')
+
     args = parser.parse_args()
 
     main(args)
@@ -0,0 +1,91 @@
+"""Columnar table of ISLR samples, with one typed NumPy array per field of the dataset file.
+
+The samples that are collected from an ELAN file (`elan_parser.ISLRSample`) are appended to the table in bulk,
+and the table is exported as a whole: to a CSV file (in the same format as before), to a Parquet file, or to a
+pandas DataFrame. Writing Parquet files requires pyarrow (or fastparquet)."""
+import csv
+from operator import attrgetter
+
+import numpy as np
+import pandas as pd
+
+# (Column name, data type, attribute of `elan_parser.ISLRSample`), in the order of the columns in the dataset file.
+COLUMNS = [
+    ('Id', np.int64, 'id'),
+    ('Gloss', object, 'gloss.gloss'),
+    ('start_ms', np.int64, 'gloss.start_ms'),
+    ('end_ms', np.int64, 'gloss.end_ms'),
+    ('EAF', object, 'metadata.filename'),
+    ('Participant', object, 'metadata.participant_name'),
+    ('Signer', object, 'metadata.participant_ID'),
+    ('SourceVideo', object, 'videos.source_video'),
+    ('SampleVideo', object, 'videos.sample_video')
+]
+
+
+class SampleTable:
+    """Table of samples, stored per column."""
+
+    def __init__(self, columns: {str: np.ndarray} = None):
+        """Create a new SampleTable instance.
+
+        :param columns: The arrays of all columns in `COLUMNS`, which should have the same length. If None, the table
+            is empty."""
+        if columns is None:
+            columns = {name: np.array([], dtype=dtype) for name, dtype, _attribute in COLUMNS}
+        self._columns = columns
+        self._chunks = []  # Appended columns that have not been concatenated with `_columns` yet.
+
+    def append(self, samples: list):
+        """Append samples (`elan_parser.ISLRSample`) to the table.
+
+        :param samples: The samples, e.g., the samples that were collected from one ELAN file."""
+        self._chunks.append({name: np.array([attrgetter(attribute)(s) for s in samples], dtype=dtype)
+                             for name, dtype, attribute in COLUMNS})
+
+    def __len__(self) -> int:
+        return len(self['Id'])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Get the array of a column."""
+        if len(self._chunks) > 0:
+            self._columns = {column: np.concatenate([self._columns[column]] + [chunk[column] for chunk in self._chunks])
+                             for column in self._columns}
+            self._chunks = []
+        return self._columns[name]
+
+    def __setitem__(self, name: str, values: np.ndarray):
+        """Replace the array of a column. It should have the same length as the table."""
+        if len(values) != len(self):
+            raise ValueError(f'Column {name} has {len(values)} values, expected {len(self)}.')
+        self._columns[name] = values
+
+    def filter(self, keep: np.ndarray) -> 'SampleTable':
+        """Get a new table with the samples (rows) for which `keep` is True."""
+        return SampleTable({name: self[name][keep] for name, _dtype, _attribute in COLUMNS})
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame({name: self[name] for name, _dtype, _attribute in COLUMNS})
+
+    def to_csv(self, path: str):
+        with open(path, 'w') as of:
+            writer = csv.writer(of)
+            writer.writerow([name for name, _dtype, _attribute in COLUMNS])
+            writer.writerows(zip(*[self[name].tolist() for name, _dtype, _attribute in COLUMNS]))
+
+    def to_parquet(self, path: str):
+        self.to_dataframe().to_parquet(path, index=False)
+
+    def save(self, path: str):
+        """Save the table as a Parquet file if the path ends with .parquet, and as a CSV file otherwise."""
+        if path.endswith('.parquet'):
+            self.to_parquet(path)
+        else:
+            self.to_csv(path)
+
+
+def read_dataframe(path: str) -> pd.DataFrame:
+    """Read a dataset file that was saved with `SampleTable.save` into a DataFrame."""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
@@ -3,4 +3,8 @@
 This code extracts features from clips using pre-trained feature extractors.
 There is a `main` module which performs the extraction, delegating to `extract_*` modules.
 The `extract_*` modules must have a function `extract(filename)` which extracts the features of a single clip.
+To support the compact output formats of `keypoint_io`, they must also have a function `to_array(features)`, which
+converts these features to an array of shape (L, K, 3), and a tuple `PART_SIZES` with the number of keypoints per body part.
+For the dense output format, they must have a function `extract_dense(filename)`, which returns such an array for a
+single clip directly, along with a boolean array of shape (L, P) indicating which of the P body parts were detected.
 """
\ No newline at end of file
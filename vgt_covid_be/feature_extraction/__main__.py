@@ -5,6 +5,7 @@ import os
 import numpy as np
 
 import feature_extraction.extract_mediapipe as mediapipe
+from feature_extraction.keypoint_io import OUTPUT_FORMATS, extension, save_dense, save_keypoints
 
 # The modules corresponding to the names of the features passed to this script's `f` flag.
 # We could also use importlib but this is easier.
@@ -24,13 +25,24 @@ def main(args):
         feature_types = args.features.split(',')
         for feature_type in feature_types:
             module = FEATURE_MODULES[feature_type]
-            clip_features[feature_type] = module.extract(clip)
+            if args.output_format == 'dense':
+                clip_features[feature_type] = module.extract_dense(clip)
+            else:
+                clip_features[feature_type] = module.extract(clip)
 
         for feature_type in clip_features.keys():
             output_dir = os.path.join(args.output, feature_type)
             os.makedirs(output_dir, exist_ok=True)
-            output_path = os.path.join(output_dir, os.path.basename(clip).replace('.mp4', '.npy'))
-            np.save(output_path, clip_features[feature_type])
+            output_path = os.path.join(output_dir, os.path.basename(clip).replace('.mp4', extension(args.output_format)))
+            if args.output_format == 'npy':
+                np.save(output_path, clip_features[feature_type])
+            elif args.output_format == 'dense':
+                save_dense(output_path, *clip_features[feature_type])
+            else:
+                # The compact formats store a single array per clip, see `keypoint_io`.
+                module = FEATURE_MODULES[feature_type]
+                save_keypoints(output_path, module.to_array(clip_features[feature_type]), args.output_format,
+                               module.PART_SIZES)
 
 
 if __name__ == '__main__':
@@ -42,6 +54,10 @@ if __name__ == '__main__':
                         default='mediapipe')
     parser.add_argument('-o', '--output', help='The output directory to which the extracted features will be saved',
                         type=str, required=True)
+    parser.add_argument('--output_format', help='The format of the feature files: npy (the raw landmarks), dense '
+                                                '(a landmark array and a presence matrix, without pickled objects), '
+                                                'or the compact float16 or uint16 formats (see keypoint_io.py).',
+                        type=str, choices=OUTPUT_FORMATS + ('dense',), default='npy')
 
     args = parser.parse_args()
 
@@ -1,7 +1,8 @@
 """Extract features using MediaPipe Holistic (https://google.github.io/mediapipe/solutions/holistic.html).
 We extract all landmarks (if they are found) per frame.
 It is possible that for certain frames, the landmarks of certain body parts are missing.
-In that case, for that frame and that body part, this module will yield `None`."""
+In that case, for that frame and that body part, this module will yield `None`.
+Alternatively, `extract_dense` returns all landmarks of a video in a single array, along with a presence matrix."""
 
 import cv2
 import numpy as np
@@ -9,6 +10,11 @@ import mediapipe as mp
 
 mp_holistic = mp.solutions.holistic
 
+# Name and number of landmarks of the body parts, in the order in which they are stored by `to_array`.
+BODY_PARTS = (('pose', 33), ('face', 468), ('left_hand', 21), ('right_hand', 21))
+PART_SIZES = tuple(size for _key, size in BODY_PARTS)
+NUM_LANDMARKS = sum(PART_SIZES)
+
 
 def extract(filename):
     """Extract all MediaPipe holistic landmarks from the given video.
@@ -18,18 +24,58 @@ def extract(filename):
       Each element in the dictionary is a list of either an array or None, if the body part was not detected
       for a given frame. There are as many elements in the list as there are frames in the clip.
     """
+    results = {
+        "pose": [],
+        "left_hand": [],
+        "right_hand": [],
+        "face": [],
+    }
+    for frame_landmarks in _process_video(filename):
+        _append_landmarks(frame_landmarks.pose_landmarks, results, "pose")
+        _append_landmarks(frame_landmarks.face_landmarks, results, "face")
+        _append_landmarks(frame_landmarks.left_hand_landmarks, results, "left_hand")
+        _append_landmarks(frame_landmarks.right_hand_landmarks, results, "right_hand")
+    return results
+
+
+def extract_dense(filename):
+    """Extract all MediaPipe holistic landmarks from the given video, as dense arrays.
+    The landmarks are written directly to preallocated arrays, which grow geometrically if the frame count of the video
+    is not known in advance.
+
+    :param filename: Path to the video.
+    :returns: A tuple (landmarks, presence). `landmarks` is a float32 array of shape (L, 543, 3) with the pose, face,
+      left hand and right hand landmarks (see `BODY_PARTS`), in which the landmarks of body parts that were not detected
+      are set to `np.nan`. `presence` is a boolean array of shape (L, 4) indicating which body parts were detected.
+    """
+    capacity = max(_frame_count(filename), 1)
+    landmarks = np.empty((capacity, NUM_LANDMARKS, 3), dtype=np.float32)
+    presence = np.empty((capacity, len(BODY_PARTS)), dtype=bool)
+    num_frames = 0
+    for frame_landmarks in _process_video(filename):
+        if num_frames == len(landmarks):
+            landmarks = np.concatenate([landmarks, np.empty_like(landmarks)])
+            presence = np.concatenate([presence, np.empty_like(presence)])
+        offset = 0
+        for part, (key, size) in enumerate(BODY_PARTS):
+            body_landmarks = getattr(frame_landmarks, f'{key}_landmarks')
+            presence[num_frames, part] = bool(body_landmarks)
+            if body_landmarks:
+                landmarks[num_frames, offset:offset + size] = [(l.x, l.y, l.z) for l in body_landmarks.landmark]
+            else:
+                landmarks[num_frames, offset:offset + size] = np.nan
+            offset += size
+        num_frames += 1
+    return landmarks[:num_frames], presence[:num_frames]
+
+
+def _process_video(filename):
+    """Helper generator which yields the MediaPipe Holistic results for every frame of the given video."""
     with mp_holistic.Holistic(
             static_image_mode=False,
             model_complexity=2,
             smooth_landmarks=True,
             min_tracking_confidence=0.75) as holistic:
-        results = {
-            "pose": [],
-            "left_hand": [],
-            "right_hand": [],
-            "face": [],
-        }
-
         cap = cv2.VideoCapture(filename)
         if not cap.isOpened():
             raise ValueError(
@@ -40,14 +86,32 @@ def extract(filename):
             if not success:
                 break
             frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame_landmarks = holistic.process(frame)
-
-            _append_landmarks(frame_landmarks.pose_landmarks, results, "pose")
-            _append_landmarks(frame_landmarks.face_landmarks, results, "face")
-            _append_landmarks(frame_landmarks.left_hand_landmarks, results, "left_hand")
-            _append_landmarks(frame_landmarks.right_hand_landmarks, results, "right_hand")
+            yield holistic.process(frame)
         cap.release()
-        return results
+
+
+def _frame_count(filename):
+    """Helper function which returns the frame count of a video according to its metadata (0 if it is unknown)."""
+    cap = cv2.VideoCapture(filename)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return max(frame_count, 0)
+
+
+def to_array(results):
+    """Convert the landmarks returned by `extract` to a single array.
+
+    :param results: The dictionary returned by `extract`.
+    :returns: A float32 array of shape (L, 543, 3), containing the pose, face, left hand and right hand landmarks
+      (see `BODY_PARTS`). The landmarks of body parts that were not detected are set to `np.nan`."""
+    keypoints = np.full((len(results['pose']), sum(PART_SIZES), 3), np.nan, dtype=np.float32)
+    offset = 0
+    for key, size in BODY_PARTS:
+        for frame_index, landmarks in enumerate(results[key]):
+            if landmarks is not None:
+                keypoints[frame_index, offset:offset + size] = landmarks
+        offset += size
+    return keypoints
 
 
 def _append_landmarks(body_landmarks, results, key):
@@ -0,0 +1,168 @@
+"""Pack the per-clip keypoint files into a few large shards, and read samples from these shards.
+
+A dataset with tens of thousands of clips results in as many keypoint files, and opening all of them (e.g., on a
+network file system) can take longer than the actual training. The packer writes the keypoints of all samples
+into a few contiguous data files instead, together with an index:
+    - shard_000.npy, shard_001.npy, ...: The keypoints of consecutive samples, concatenated along the frame axis.
+      Every shard is a regular NumPy array of shape (F, K, 3), which can be memory-mapped.
+    - index.npz: For every sample, its Id and the shard, frame offset and number of frames of its keypoints.
+Missing keypoints are NaN, as in the keypoint files."""
+import argparse
+import glob
+import os
+
+import numpy as np
+
+from feature_extraction.keypoint_io import PRESENCE_SUFFIX, load_keypoints
+
+INDEX_FILE = 'index.npz'
+
+
+def main(args):
+    # The Id of a sample is the name of its feature file (i.e., of its clip) without extension.
+    paths = sorted(glob.glob(os.path.join(args.directory, '*.npy')) + glob.glob(os.path.join(args.directory, '*.npz')))
+    paths = [path for path in paths if not path.endswith(PRESENCE_SUFFIX)]  # Part of the dense format.
+    samples = [(os.path.splitext(os.path.basename(path))[0], path) for path in paths]
+
+    shard_files = pack_keypoints(samples, args.out_dir, args.shard_size * 1024 * 1024, np.dtype(args.dtype),
+                                 args.allow_pickle)
+    print(f'Packed {len(samples)} samples into {len(shard_files)} shards in {args.out_dir}.')
+
+
+def pack_keypoints(samples: [(str, str)], out_dir: str, shard_size: int, dtype: np.dtype = np.float32,
+                   allow_pickle: bool = False) -> [str]:
+    """Pack the keypoint files of the given samples into shards.
+
+    The number of frames of every sample is read from the header of its file first, so that every shard can be
+    written to a memory-mapped file, one sample at a time. Every file is then loaded once. Pickled files have no such
+    header, so they are unpickled twice.
+
+    :param samples: Tuples of (sample Id, path to the feature file), in the order in which they should be stored.
+    :param out_dir: Output directory for the shards and the index.
+    :param shard_size: Maximum size of a shard in bytes. A sample that is larger than this gets a shard of its own.
+    :param dtype: Data type of the keypoints in the shards, e.g., float32 or float16.
+    :param allow_pickle: Also load NPY files with pickled objects (the raw landmarks of the `npy` output format of
+        __main__.py). Unpickling can execute arbitrary code, so only use this for files you trust.
+    :return: The file names of the shards.
+    :raises ValueError: If a file contains pickled objects and `allow_pickle` is False."""
+    os.makedirs(out_dir, exist_ok=True)
+    shapes = [_feature_shape(path, allow_pickle) for _sample_id, path in samples]
+    frame_shape = tuple(shapes[0][1:]) if len(shapes) > 0 else (0, 3)
+    frame_size = max(int(np.prod(frame_shape)) * dtype.itemsize, 1)
+
+    # Assign consecutive samples to shards.
+    shards = np.zeros(len(samples), dtype=np.int32)
+    offsets = np.zeros(len(samples), dtype=np.int64)
+    lengths = np.array([shape[0] for shape in shapes], dtype=np.int64)
+    shard_lengths = [0]
+    for i, length in enumerate(lengths):
+        if shard_lengths[-1] > 0 and (shard_lengths[-1] + length) * frame_size > shard_size:
+            shard_lengths.append(0)
+        shards[i] = len(shard_lengths) - 1
+        offsets[i] = shard_lengths[-1]
+        shard_lengths[-1] += int(length)
+
+    shard_files = [f'shard_{shard:03d}.npy' for shard in range(len(shard_lengths))]
+    for shard, shard_file in enumerate(shard_files):
+        data = np.lib.format.open_memmap(os.path.join(out_dir, shard_file), mode='w+', dtype=dtype,
+                                         shape=(shard_lengths[shard],) + frame_shape)
+        for i in np.flatnonzero(shards == shard):
+            data[offsets[i]:offsets[i] + lengths[i]] = _load_features(samples[i][1], allow_pickle)
+        data.flush()
+        del data
+
+    np.savez(os.path.join(out_dir, INDEX_FILE),
+             ids=np.array([sample_id for sample_id, _path in samples], dtype=str),
+             shards=shards, offsets=offsets, lengths=lengths, shard_files=np.array(shard_files, dtype=str))
+    return shard_files
+
+
+class KeypointShards:
+    """Read the keypoints of samples from the shards written by `pack_keypoints`.
+
+    The shards are memory-mapped when they are first accessed, and the keypoints of a sample are returned as a view
+    into a shard, so no data is copied or read until it is used. The views are read-only."""
+
+    def __init__(self, directory: str):
+        """Open the shards in the given directory.
+
+        :param directory: The output directory of `pack_keypoints`."""
+        self.directory = directory
+        with np.load(os.path.join(directory, INDEX_FILE)) as index:
+            self.ids = index['ids'].tolist()
+            self._shards = index['shards']
+            self._offsets = index['offsets']
+            self._lengths = index['lengths']
+            self._shard_files = index['shard_files'].tolist()
+        self._rows = {sample_id: row for row, sample_id in enumerate(self.ids)}
+        self._data = [None] * len(self._shard_files)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, sample_id) -> bool:
+        return str(sample_id) in self._rows
+
+    def __getitem__(self, sample_id) -> np.ndarray:
+        """Get the keypoints of a sample, as a read-only view of shape (L, K, 3).
+
+        :param sample_id: The Id of the sample, i.e., the name of its clip without extension.
+        :raises KeyError: If there is no sample with this Id."""
+        row = self._rows[str(sample_id)]
+        shard = self._shards[row]
+        if self._data[shard] is None:
+            self._data[shard] = np.load(os.path.join(self.directory, self._shard_files[shard]), mmap_mode='r')
+        return self._data[shard][self._offsets[row]:self._offsets[row] + self._lengths[row]]
+
+    def num_frames(self, sample_id) -> int:
+        """Get the number of frames of a sample, without accessing its keypoints."""
+        return int(self._lengths[self._rows[str(sample_id)]])
+
+
+def _feature_shape(path: str, allow_pickle: bool = False) -> (int, int, int):
+    """Get the shape of the keypoints in a feature file, from the header of the file if possible."""
+    if path.endswith('.npz'):
+        with np.load(path) as archive:
+            return int(archive['num_frames']), int(np.sum(archive['part_sizes'])), 3
+    try:
+        return np.load(path, mmap_mode='r').shape
+    except ValueError:  # Arrays of pickled objects cannot be memory-mapped.
+        return _load_features(path, allow_pickle).shape
+
+
+def _load_features(path: str, allow_pickle: bool = False) -> np.ndarray:
+    """Load a MediaPipe feature file that was written by `feature_extraction` in any output format, as an array of
+    shape (L, 543, 3).
+
+    :raises ValueError: If the file contains pickled objects and `allow_pickle` is False."""
+    if path.endswith('.npz'):
+        return load_keypoints(path)
+    try:
+        features = np.load(path, allow_pickle=allow_pickle)
+    except ValueError as e:
+        raise ValueError(f'{path} contains pickled objects, which are only loaded with allow_pickle (--allow_pickle '
+                         f'on the command line).') from e
+    if features.dtype == object:  # The dictionary of landmarks returned by `extract_mediapipe.extract`.
+        # Imported here, so that reading the shards does not require MediaPipe.
+        import feature_extraction.extract_mediapipe as mediapipe
+        return mediapipe.to_array(features.item())
+    return features
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-d', '--directory', help='The directory containing the MediaPipe feature files', type=str,
+                        required=True)
+    parser.add_argument('-o', '--out_dir', help='The output directory to which the shards and the index will be saved',
+                        type=str, required=True)
+    parser.add_argument('--shard_size', help='The maximum size of a shard in MiB', type=int, default=1024)
+    parser.add_argument('--dtype', help='The data type of the keypoints in the shards', type=str,
+                        choices=['float32', 'float16'], default='float32')
+    parser.add_argument('--allow_pickle', help='Also pack NPY files with pickled objects (the raw landmarks of the npy '
+                                               'output format). Only use this for files you trust',
+                        action='store_true')
+
+    args = parser.parse_args()
+
+    main(args)
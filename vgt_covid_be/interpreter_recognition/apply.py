@@ -2,12 +2,11 @@ import argparse
 import json
 import os
 
-import PIL
 import cv2
 import torch
-from torchvision.transforms import transforms
 
 from model import Classifier
+from preprocessing import preprocess_frames
 
 
 def main(args):
@@ -15,13 +14,6 @@ def main(args):
     model.load_state_dict(torch.load(args.checkpoint_path, map_location='cpu'), strict=True)
     model.eval()
 
-    eval_transforms = transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-    ])
-
     bounding_box = [int(e) for e in args.bounding_box.split(',')]
 
     segments = []
@@ -49,11 +41,8 @@ def main(args):
                 resolution = (image.shape[1], image.shape[0])
             image = image[bounding_box[1]:bounding_box[1] + bounding_box[3],
                     bounding_box[0]:bounding_box[0] + bounding_box[2]]
-            frame = PIL.Image.fromarray(image)
-
-            frame = eval_transforms(frame)
 
-            model_input = frame.unsqueeze(0)
+            model_input = preprocess_frames([image])
 
             model_output = model(model_input).item()
             model_prediction = model_output > 0.5
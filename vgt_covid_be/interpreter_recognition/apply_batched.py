@@ -2,12 +2,12 @@ import argparse
 import json
 import os
 
-import PIL
 import cv2
 import torch
-from torchvision.transforms import transforms
 
+from frame_pipeline import FramePipeline
 from model import Classifier
+from preprocessing import preprocess_frames
 
 
 def main(args):
@@ -16,19 +16,10 @@ def main(args):
     model.eval()
     model.to(args.device)
 
-    eval_transforms = transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-    ])
-
     bounding_box = [int(e) for e in args.bounding_box.split(',')]
 
     segments = []
 
-    resolution = None
-
     with torch.no_grad():
         cap = cv2.VideoCapture(args.input_sample)
         fps = cap.get(cv2.CAP_PROP_FPS)
@@ -39,34 +30,16 @@ def main(args):
 
         cap.set(cv2.CAP_PROP_POS_FRAMES, int(args.start_seconds * fps))
         current_frame_index = int(args.start_seconds * fps)
-        while cap.isOpened():
-            batch = []
-            for _ in range(args.batch_size):
-                success, image = cap.read()
-                if not success:
-                    print(f'Unable to read frame {current_frame_index} from stream {os.path.basename(args.input_sample)}')
-                    break
-
-                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                if resolution is None:
-                    resolution = (image.shape[1], image.shape[0])
-                image = image[bounding_box[1]:bounding_box[1] + bounding_box[3],
-                        bounding_box[0]:bounding_box[0] + bounding_box[2]]
-                frame = PIL.Image.fromarray(image)
-
-                frame = eval_transforms(frame)
-                batch.append(frame)
-
-            if len(batch) == 0:
-                break
-
-            model_input = torch.stack(batch).to(args.device)
-
-            model_output = model(model_input).cpu()
+
+        # Frames are decoded and preprocessed in background threads, while the model processes the previous batch.
+        pipeline = FramePipeline(cap, bounding_box, preprocess_frames, args.batch_size, args.queue_size,
+                                 args.preprocess_threads)
+        for model_input, batch_length in pipeline:
+            model_output = model(model_input.to(args.device)).cpu()
             model_predictions = model_output > 0.5
 
-            for batch_idx in range(len(batch)):
-                if len(batch) == 1:
+            for batch_idx in range(batch_length):
+                if batch_length == 1:
                     model_prediction = model_predictions.item()
                 else:
                     model_prediction = model_predictions[batch_idx].item()
@@ -106,6 +79,12 @@ def main(args):
             # cv2.imshow(str(output_prediction), image)
             # cv2.waitKey(0)
 
+        # The pipeline stops at the first frame that cannot be read, which is only an error before the end of the video.
+        if current_frame_index < int(cap.get(cv2.CAP_PROP_FRAME_COUNT)):
+            print(f'Unable to read frame {current_frame_index} from stream {os.path.basename(args.input_sample)}')
+        print(pipeline.report())
+        resolution = pipeline.resolution
+
         # If we ended the video in VGT mode, we need to set the last end index.
         if len(segments) > 0 and segments[-1]['end'] == -1:
             segments[-1]['end'] = current_frame_index - 1
@@ -145,6 +124,10 @@ if __name__ == '__main__':
     parser.add_argument('-d', '--device', help='PyTorch device string', type=str, default='cpu')
     parser.add_argument('-z', '--batch-size', help='Batch size', type=int, default=1)
     parser.add_argument('-n', '--interpreter', help='Interpreter ID', type=int, required=True)
+    parser.add_argument('-q', '--queue-size', help='Number of batches that are decoded and preprocessed ahead of the model',
+                        type=int, default=4)
+    parser.add_argument('-p', '--preprocess-threads', help='Number of threads that preprocess batches', type=int,
+                        default=1)
 
     args = parser.parse_args()
 
@@ -6,9 +6,17 @@ import PIL
 import cv2
 import torch
 
+from preprocessing import preprocess_frames
+
 
 class Dataset(torch.utils.data.Dataset):
     def __init__(self, root_dir, transforms, job):
+        """
+        :param root_dir: Directory with the MP4 clips.
+        :param transforms: PIL image transforms, or None to preprocess the frames as the evaluation transforms do,
+            without converting them to PIL images (see preprocessing.py).
+        :param job: 'train', 'validate' or 'test'.
+        """
         super().__init__()
 
         self.root_dir = root_dir
@@ -49,9 +57,12 @@ class Dataset(torch.utils.data.Dataset):
         assert success
 
         frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame = PIL.Image.fromarray(frame)
+        if self.transforms is None:
+            frame = preprocess_frames([frame])[0]
+        else:
+            frame = PIL.Image.fromarray(frame)
 
-        frame = self.transforms(frame)
+            frame = self.transforms(frame)
 
         # Sample filename structure: FILENAME__LANGUAGE_INDEX
         language = self.samples[sample_index].split('__')[1].split('_')[0]
@@ -0,0 +1,165 @@
+"""Decode, preprocess and classify the frames of a video in concurrent stages.
+
+Instead of decoding and preprocessing a batch of frames and only then running the model (so that every stage waits
+for the others), the stages run concurrently and exchange work through bounded queues:
+    - A decoder thread reads the frames from the video, converts them to RGB, crops the bounding box and groups the
+      cropped frames into batches.
+    - A pool of preprocessing threads turns the batches of cropped frames into model inputs.
+    - The caller iterates over the model inputs and runs the model, while the next batches are being decoded and
+      preprocessed.
+OpenCV and PyTorch release the GIL for the heavy work, so threads suffice. The queues limit the number of frames in
+memory. Every stage records the number of frames it processed and the time it was busy, so the slowest stage can be
+identified from `FramePipeline.report`."""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+_END = object()  # Put in the queue by the decoder after the last batch.
+
+
+class StageStats:
+    """The number of frames that a stage processed, and the time it was busy doing so."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.frames = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, frames: int, seconds: float):
+        with self._lock:
+            self.frames += frames
+            self.seconds += seconds
+
+    def __str__(self) -> str:
+        throughput = self.frames / self.seconds if self.seconds > 0 else float('inf')
+        return f'{self.name}: {self.frames} frames in {self.seconds:.2f} s ({throughput:.1f} frames/s)'
+
+
+class FramePipeline:
+    """Iterates over the model inputs for the frames of a video, which are decoded and preprocessed ahead in threads.
+
+    The pipeline reads from the current position of the video capture until a frame cannot be read. Batches are
+    yielded in order, as tuples (model input, number of frames)."""
+
+    def __init__(self, cap: cv2.VideoCapture, bounding_box: [int], preprocess, batch_size: int, queue_size: int = 4,
+                 num_threads: int = 1):
+        """Create a new FramePipeline instance.
+
+        :param cap: The video capture, positioned at the first frame to process.
+        :param bounding_box: The bounding box as x, y, w, h, which is cropped from the RGB frames.
+        :param preprocess: Function that takes a list of cropped RGB frames (NumPy uint8 arrays) and returns the
+            model input for these frames.
+        :param batch_size: The number of frames per batch.
+        :param queue_size: The maximum number of batches that are decoded, or being preprocessed, ahead of the model.
+        :param num_threads: The number of preprocessing threads."""
+        self.cap = cap
+        self.bounding_box = bounding_box
+        self.preprocess = preprocess
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.num_threads = num_threads
+        self.resolution = None  # (width, height) of the first frame that was read.
+        self.decode_stats = StageStats('Decoding')
+        self.preprocess_stats = StageStats(f'Preprocessing ({num_threads} threads)')
+        self.model_stats = StageStats('Model')
+        self.wait_seconds = 0.0  # Time that the model waited for its input.
+        self._start_time = None
+        self._end_time = None
+
+    def __iter__(self):
+        self._start_time = time.perf_counter()
+        frame_batches = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        decoder = threading.Thread(target=self._decode, args=(frame_batches, stop), daemon=True)
+        decoder.start()
+        pending = deque()  # Futures of the model inputs, in order.
+        executor = ThreadPoolExecutor(max_workers=self.num_threads)
+        try:
+            end_of_stream = False
+            while not end_of_stream or len(pending) > 0:
+                # Keep the preprocessing threads busy with the next batches, but only wait for the decoder if
+                # there is nothing to yield.
+                while not end_of_stream and len(pending) < self.queue_size:
+                    try:
+                        frames = frame_batches.get(block=len(pending) == 0)
+                    except queue.Empty:
+                        break
+                    if frames is _END:
+                        end_of_stream = True
+                    elif isinstance(frames, Exception):
+                        raise frames
+                    else:
+                        pending.append((len(frames), executor.submit(self._preprocess, frames)))
+                if len(pending) == 0:
+                    break
+                num_frames, future = pending.popleft()
+                wait_start = time.perf_counter()
+                model_input = future.result()
+                self.wait_seconds += time.perf_counter() - wait_start
+                model_start = time.perf_counter()
+                yield model_input, num_frames
+                self.model_stats.add(num_frames, time.perf_counter() - model_start)
+        finally:
+            # If the consumer stopped early, stop the decoder and cancel the queued preprocessing jobs before shutting
+            # down the pool, so that only the jobs that are already running are waited for (shutdown has no
+            # cancel_futures argument in Python 3.8).
+            stop.set()
+            for _num_frames, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            decoder.join()
+            self._end_time = time.perf_counter()
+
+    def report(self) -> str:
+        """Get the throughput of every stage. The model stage includes everything the caller does with a batch."""
+        lines = [str(stats) for stats in (self.decode_stats, self.preprocess_stats, self.model_stats)]
+        lines.append(f'Model waiting for input: {self.wait_seconds:.2f} s')
+        if self._start_time is not None and self._end_time is not None:
+            total = StageStats('Total')
+            total.add(self.model_stats.frames, self._end_time - self._start_time)
+            lines.append(str(total))
+        return '\n'.join(lines)
+
+    def _decode(self, frame_batches: queue.Queue, stop: threading.Event):
+        x, y, w, h = self.bounding_box
+        try:
+            end_of_stream = False
+            while not end_of_stream and not stop.is_set():
+                decode_start = time.perf_counter()
+                frames = []
+                while len(frames) < self.batch_size:
+                    success, image = self.cap.read()
+                    if not success:
+                        end_of_stream = True
+                        break
+                    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                    if self.resolution is None:
+                        self.resolution = (image.shape[1], image.shape[0])
+                    frames.append(image[y:y + h, x:x + w])
+                self.decode_stats.add(len(frames), time.perf_counter() - decode_start)
+                if len(frames) > 0:
+                    self._put(frame_batches, frames, stop)
+            self._put(frame_batches, _END, stop)
+        except Exception as e:
+            self._put(frame_batches, e, stop)
+
+    def _preprocess(self, frames: list):
+        preprocess_start = time.perf_counter()
+        model_input = self.preprocess(frames)
+        self.preprocess_stats.add(len(frames), time.perf_counter() - preprocess_start)
+        return model_input
+
+    @staticmethod
+    def _put(frame_batches: queue.Queue, item, stop: threading.Event):
+        """Put an item in the queue, unless the consumer stopped."""
+        while not stop.is_set():
+            try:
+                frame_batches.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
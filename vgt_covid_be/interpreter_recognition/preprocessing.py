@@ -0,0 +1,92 @@
+"""Preprocess batches of RGB frames for the classifier with PyTorch, without converting them to PIL images.
+
+This is the equivalent of the evaluation transforms (Resize(256), CenterCrop(224), ToTensor and Normalize), for a
+whole batch of frames at once:
+    - The batch is resized with `torch.nn.functional.interpolate`, so that the shorter side of the frames is 256
+      pixels. Antialiased bilinear interpolation uses the same filter as PIL's bilinear resize. Like PIL, the batch is
+      resized horizontally first and rounded to uint8 values, and then resized vertically and rounded again. PIL
+      computes with fixed-point filter coefficients, so a value can still differ by one uint8 level, and the mean
+      difference is a small fraction of a level (see `MAX_TOLERANCE`, `MEAN_TOLERANCE` and
+      test_preprocessing.py).
+    - The center crop is a slice of the resized batch.
+    - ToTensor and Normalize are done for the whole batch at once, with the same float32 operations as the torchvision
+      transforms, so they give the same values.
+The result is a float32 tensor of shape (N, 3, 224, 224), which can be passed to the model."""
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+RESIZE_SIZE = 256
+CROP_SIZE = 224
+MEAN = [0.485, 0.456, 0.406]
+STD = [0.229, 0.224, 0.225]
+# Maximum difference with the torchvision evaluation transforms, in uint8 levels: for a single value, and on average.
+MAX_TOLERANCE = 1
+MEAN_TOLERANCE = 0.05
+
+
+def resized_size(width: int, height: int, size: int = RESIZE_SIZE) -> (int, int):
+    """Get the (width, height) to which Resize(size) resizes a frame: the shorter side becomes `size`, and the aspect
+    ratio is kept."""
+    if width <= height:
+        return size, int(size * height / width)
+    return int(size * width / height), size
+
+
+def _interpolate(batch: torch.Tensor, height: int, width: int) -> torch.Tensor:
+    """Resize a float batch of shape (N, 3, H, W) with antialiased bilinear interpolation, and round it to uint8
+    values."""
+    batch = F.interpolate(batch, size=(height, width), mode='bilinear', align_corners=False, antialias=True)
+    return batch.round_().clamp_(0, 255)
+
+
+def resize_and_crop(frames: [np.ndarray], size: int = RESIZE_SIZE, crop_size: int = CROP_SIZE) -> torch.Tensor:
+    """Resize the frames so that their shorter side is `size`, and crop the center.
+
+    :param frames: RGB frames (uint8 arrays of shape (H, W, 3)), e.g., the interpreter bounding boxes of a batch.
+    :param size: The length of the shorter side after resizing.
+    :param crop_size: The width and height of the center crop.
+    :return: A float32 tensor of shape (N, 3, crop_size, crop_size), with uint8 values."""
+    if len({frame.shape for frame in frames}) > 1:
+        # Frames of different sizes are resized separately.
+        return torch.cat([resize_and_crop([frame], size, crop_size) for frame in frames])
+    batch = torch.from_numpy(np.stack(frames)).permute(0, 3, 1, 2).float()
+    height, width = batch.shape[2:]
+    new_width, new_height = resized_size(width, height, size)
+    # PIL resizes horizontally and then vertically, with uint8 values in between.
+    if new_width != width:
+        batch = _interpolate(batch, height, new_width)
+    if new_height != height:
+        batch = _interpolate(batch, new_height, new_width)
+    top = int(round((new_height - crop_size) / 2.0))
+    left = int(round((new_width - crop_size) / 2.0))
+    return batch[:, :, top:top + crop_size, left:left + crop_size]
+
+
+def normalize(batch: torch.Tensor) -> torch.Tensor:
+    """Normalise a batch of shape (N, 3, H, W) with uint8 values, as ToTensor and Normalize do."""
+    normalized = batch.div(255)
+    normalized.sub_(torch.tensor(MEAN)[:, None, None])
+    normalized.div_(torch.tensor(STD)[:, None, None])
+    return normalized.contiguous()
+
+
+def preprocess_frames(frames: [np.ndarray]) -> torch.Tensor:
+    """Preprocess RGB frames as the evaluation transforms do.
+
+    :param frames: RGB frames (uint8 arrays of shape (H, W, 3)).
+    :return: A float32 tensor of shape (N, 3, 224, 224)."""
+    return normalize(resize_and_crop(frames))
+
+
+def difference_with_transforms(frames: [np.ndarray], transforms) -> (float, float):
+    """Compare `preprocess_frames` with the torchvision evaluation transforms.
+
+    :param frames: RGB frames (uint8 arrays of shape (H, W, 3)).
+    :param transforms: The evaluation transforms, which take a PIL image and return a tensor of shape (3, 224, 224).
+    :return: The mean and maximum absolute difference, in uint8 levels."""
+    import PIL.Image
+
+    expected = torch.stack([transforms(PIL.Image.fromarray(frame)) for frame in frames])
+    difference = (preprocess_frames(frames) - expected).abs() * torch.tensor(STD)[:, None, None] * 255
+    return difference.mean().item(), difference.max().item()
@@ -0,0 +1,56 @@
+"""Check that `preprocess_frames` matches the torchvision evaluation transforms within the tolerance.
+
+Run with `python -m pytest` from the repository root."""
+import numpy as np
+import pytest
+
+pytest.importorskip('torch')
+transforms = pytest.importorskip('torchvision.transforms')
+
+from interpreter_recognition.preprocessing import MAX_TOLERANCE, MEAN_TOLERANCE, difference_with_transforms, \
+    preprocess_frames
+
+EVAL_TRANSFORMS = transforms.Compose([
+    transforms.Resize(256),
+    transforms.CenterCrop(224),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+])
+# Bounding boxes that are upscaled, slightly and strongly downscaled, in portrait and in landscape orientation.
+SIZES = [(200, 180), (300, 260), (257, 256), (400, 300), (500, 400), (900, 700), (720, 1280)]
+
+
+def _frames(height: int, width: int) -> {str: np.ndarray}:
+    """Smooth frames, frames with a sharp edge, and frames of random noise (the worst case)."""
+    rng = np.random.default_rng(height * width)
+    noise = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    # Repeat a coarse noise pattern and average neighbouring pixels.
+    coarse = np.repeat(np.repeat(noise[::8, ::8], 8, axis=0), 8, axis=1)[:height, :width].astype(np.float32)
+    smooth = ((coarse + np.roll(coarse, 4, axis=0) + np.roll(coarse, 4, axis=1)) / 3).astype(np.uint8)
+    edge = np.full((height, width, 3), 30, dtype=np.uint8)
+    edge[height // 3:height // 2, width // 4:width // 2] = 220
+    return {'smooth': smooth, 'edge': edge, 'noise': noise}
+
+
+@pytest.mark.parametrize('height, width', SIZES)
+@pytest.mark.parametrize('kind', ['smooth', 'edge', 'noise'])
+def test_matches_transforms(height, width, kind):
+    mean_difference, max_difference = difference_with_transforms([_frames(height, width)[kind]], EVAL_TRANSFORMS)
+    # Allow for float32 rounding errors in the normalisation.
+    assert max_difference <= MAX_TOLERANCE + 1e-3
+    assert mean_difference <= MEAN_TOLERANCE
+
+
+def test_batch_matches_single_frames():
+    frames = list(_frames(300, 260).values())
+    batch = preprocess_frames(frames)
+    assert batch.shape == (3, 3, 224, 224)
+    for i, frame in enumerate(frames):
+        assert (batch[i] == preprocess_frames([frame])[0]).all()
+
+
+def test_frames_of_different_sizes():
+    frames = [_frames(300, 260)['noise'], _frames(720, 1280)['noise']]
+    batch = preprocess_frames(frames)
+    assert batch.shape == (2, 3, 224, 224)
+    assert (batch[1] == preprocess_frames(frames[1:])[0]).all()
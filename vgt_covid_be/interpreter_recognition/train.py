@@ -116,16 +116,10 @@ def _get_data_loaders(args):
         transforms.ToTensor(),
         transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
     ])
-    eval_transforms = transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-    ])
-
+    # The validation and test frames are preprocessed as in apply.py and apply_batched.py (see preprocessing.py).
     train_dataset = Dataset(args.data_dir, train_transforms, 'train')
-    val_dataset = Dataset(args.data_dir, eval_transforms, 'validate')
-    test_dataset = Dataset(args.data_dir, eval_transforms, 'test')
+    val_dataset = Dataset(args.data_dir, None, 'validate')
+    test_dataset = Dataset(args.data_dir, None, 'test')
     train_loader = DataLoader(train_dataset, batch_size=args.batch_size, shuffle=True, num_workers=4, pin_memory=True,
                               drop_last=True)
     val_loader = DataLoader(val_dataset, batch_size=args.batch_size, shuffle=False, num_workers=4, pin_memory=True,